@@ -6,6 +6,50 @@
 # 代理端口
 PROXY = "your_proxy"
 
+# HTTP连接池（计数、翻页、下载共用）
+HTTP_POOL = {
+    "limit": 100,           # 总连接数上限
+    "limit_per_host": 16,   # 单个host连接数上限
+    "keepalive_timeout": 30,# 空闲连接保活（秒）
+    "dns_cache_ttl": 300    # DNS缓存（秒）
+}
+
+# 元数据抓取并发（自适应）
+# 延迟与状态码正常时逐步提高并发，遇到 429/503/超时 时并发数减半
+CONCURRENCY = {
+    "min_concurrency": 1,
+    "max_concurrency": 16,
+    "initial_concurrency": 4,
+    "target_latency": 2.0 # 单页请求目标耗时（秒）
+}
+
+# 按 host 限速：host -> (每秒请求数, 突发容量)，"*.域名" 匹配所有子域名
+# 元数据抓取与图片下载共用，未列出的 host 使用 DEFAULT_RATE
+RATE_LIMITS = {
+    "danbooru.donmai.us": (10, 10),
+    "cdn.donmai.us": (20, 20),
+    "gelbooru.com": (5, 5),
+    "*.gelbooru.com": (20, 20)
+}
+DEFAULT_RATE = (10, 10)
+
+# 页面解码（JSON解析与数据转换）
+# "thread"：线程池；"process"：进程池（多核并行，适合高并发大页面）；"inline"：在事件循环中直接解码
+# 安装 orjson 后自动使用更快的JSON解析
+DECODE = {
+    "mode": "thread",
+    "workers": 2
+}
+
+# 失败重试（元数据抓取与图片下载共用）
+# 429/5xx/超时 按指数退避+随机抖动重试，服务器返回 Retry-After 时按其等待
+RETRY = {
+    "max_attempts": 4,  # 超时/连接错误的最大尝试次数
+    "base_delay": 1.0,  # 退避基础延迟（秒）
+    "max_delay": 60.0,  # 单次等待上限（秒）
+    "budget": 200       # 每次任务允许的重试总次数
+}
+
 
 # 站点相关 ---------------------------------------------------------
 # 只保留使用的网站 不使用的网站全部注释掉
@@ -37,6 +81,16 @@ HEADERS = {
 
 # 检索相关 ---------------------------------------------------------
 
+# 分页方式
+# "auto"：超过站点页码上限（Danbooru 1000页 / Gelbooru 20000条）时自动改用游标分页
+# "offset"：始终按页码翻页（可并发）
+# "cursor"：始终按 id 游标翻页（需按 id 倒序，深度翻页不变慢）
+PAGINATION = "auto"
+
+# 增量抓取 bool
+# 记录每个检索上次抓到的最大id，再次运行时只抓取更新的数据（需按 id 倒序）
+INCREMENTAL = False
+
 # 排序
 SORT_BY = "id" # "updated", "score", "id"(default)
 
@@ -66,6 +120,15 @@ SAVE_DATA = True # bool
 # csv保存地址
 DATA_OUTPUT_PATH = "data_output_path"
 
+# 同时保存到 Parquet 列式数据集（需安装 pyarrow），读取时可只加载需要的列并按条件过滤
+SAVE_PARQUET = False # bool
+
+# Parquet数据集目录
+PARQUET_PATH = "parquet_path"
+
+# 分区列：按站点分区，可追加 "Query"（检索名）、"Month"（发布年月）、"Artist" 等
+PARQUET_PARTITION_BY = ["Site"]
+
 # 下载图片
 DOWNLOAD_IMAGES = True # bool
 
@@ -81,6 +144,19 @@ DATABASE = True # bool
 # 数据库保存地址
 DATABASE_PATH = "database_path"
 
+# SQLite性能参数（每个连接建立时设置）
+SQLITE_PROFILE = {
+    "journal_mode": "WAL",      # 预写日志，读写互不阻塞
+    "synchronous": "NORMAL",    # WAL下足够安全，提交更快
+    "cache_size": -65536,       # 页缓存，负数为KiB（64MB）
+    "mmap_size": 268435456,     # 内存映射（256MB），0为关闭
+    "temp_store": "MEMORY"
+}
+
+# 画师名单保存到数据库（需开启 DATABASE），抓取 Danbooru 时自动记录作品的画师标签，
+# 之后抓取 Gelbooru 等不带画师字段的站点时按标签匹配画师；名单有变化时同步导出 artists_roster.txt
+ROSTER_DB = True # bool
+
 # 是否生成词云图
 WORDCLOUD = True # bool
 
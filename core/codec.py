@@ -0,0 +1,43 @@
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 优先使用更快的JSON库（orjson），未安装时退回标准库
+try:
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    JSON_BACKEND = "orjson"
+except ImportError:
+    def loads(data):
+        return json.loads(data)
+
+    JSON_BACKEND = "json"
+
+
+@dataclass
+class DecodeConfig:
+    """页面解码方式"""
+    mode: str = "thread"  # "inline"：在事件循环中解码；"thread"：线程池；"process"：进程池（多核并行）
+    workers: int = 2
+
+    def __post_init__(self):
+        if self.mode not in ("inline", "thread", "process"):
+            raise ValueError(f"无效的解码模式: {self.mode!r}")
+
+
+def create_decode_pool(config: DecodeConfig) -> Executor:
+    """按配置创建解码用的线程池/进程池，inline 模式返回None"""
+    if config.mode == "thread":
+        pool = ThreadPoolExecutor(max_workers=config.workers, thread_name_prefix="decode")
+    elif config.mode == "process":
+        pool = ProcessPoolExecutor(max_workers=config.workers)
+    else:
+        return None
+    logger.debug(f"页面解码: {config.mode} x{config.workers} ({JSON_BACKEND})")
+    return pool
@@ -0,0 +1,79 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 视为"服务器拥塞"的状态码，收到后并发数乘性减小
+CONGESTION_STATUS = {429, 503}
+
+
+@dataclass
+class ConcurrencyPolicy:
+    """自适应并发策略配置"""
+    min_concurrency: int = 1
+    max_concurrency: int = 16
+    initial_concurrency: int = 4
+    target_latency: float = 2.0  # 单页请求的目标耗时（秒），超过则停止增加并发
+    increase_step: float = 1.0   # 每轮健康请求后增加的并发数（加性增）
+    decrease_factor: float = 0.5 # 拥塞时并发数的缩减系数（乘性减）
+
+    def __post_init__(self):
+        if self.min_concurrency < 1:
+            raise ValueError("min_concurrency 必须 >= 1")
+        if self.max_concurrency < self.min_concurrency:
+            raise ValueError("max_concurrency 不能小于 min_concurrency")
+        if not 0 < self.decrease_factor < 1:
+            raise ValueError("decrease_factor 必须在 (0, 1) 之间")
+        self.initial_concurrency = min(max(self.initial_concurrency, self.min_concurrency), self.max_concurrency)
+
+
+class AIMDController:
+    """AIMD 并发控制器：健康时逐步放开并发，遇到429/503/超时时乘性回退"""
+
+    def __init__(self, policy: ConcurrencyPolicy = None):
+        self.policy = policy or ConcurrencyPolicy()
+        self.limit = float(self.policy.initial_concurrency)
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        # 每次回退时递增，回退前发出的请求再失败不会重复回退
+        self._epoch = 0
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self) -> int:
+        """等待空闲并发槽位，返回当前的回退轮次（release时传回）"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+            return self._epoch
+
+    async def release(self, epoch: int, latency: float, status=None) -> None:
+        """
+        归还槽位并根据本次请求的结果调整并发上限
+        status: HTTP状态码；超时或连接异常时传入 "timeout"
+        """
+        async with self._cond:
+            self.in_flight -= 1
+            self._adjust(epoch, latency, status)
+            self._cond.notify_all()
+
+    def _adjust(self, epoch, latency, status):
+        policy = self.policy
+        if status == "timeout" or status in CONGESTION_STATUS:
+            if epoch != self._epoch:
+                return
+            old = self.current_limit
+            self.limit = max(float(policy.min_concurrency), self.limit * policy.decrease_factor)
+            self._epoch += 1
+            logger.debug(f"检测到拥塞({status})，并发数 {old} -> {self.current_limit}")
+            return
+
+        if status == 200 and latency <= policy.target_latency:
+            # 每完成一"轮"(约等于当前并发数个)健康请求，并发数加一
+            old = self.current_limit
+            self.limit = min(float(policy.max_concurrency), self.limit + policy.increase_step / max(self.limit, 1.0))
+            if self.current_limit != old:
+                logger.debug(f"延迟正常({latency:.2f}s)，并发数 {old} -> {self.current_limit}")
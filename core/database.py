@@ -1,7 +1,14 @@
+import heapq
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Table, ForeignKey
+from collections import Counter
+from contextlib import contextmanager
+from itertools import combinations
+from dataclasses import dataclass
+from sqlalchemy import create_engine, event, inspect, select, text, func, Column, Index, Integer, LargeBinary, String, Table, ForeignKey
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from core.models import ImageItem
+from core.vocab import TAG_VOCAB
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +29,64 @@ image_artist_table = Table(
     Column('artist_id', Integer, ForeignKey('artists.id', ondelete="CASCADE"), primary_key=True)
 )
 
+# ---------------- 统计表（写入时增量维护，可用 rebuild_stats 全量重建） ----------------
+# 标签出现次数
+tag_stats_table = Table(
+    'tag_stats', Base.metadata,
+    Column('tag_id', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+# 画师-标签 出现次数
+artist_tag_stats_table = Table(
+    'artist_tag_stats', Base.metadata,
+    Column('artist_id', Integer, primary_key=True),
+    Column('tag_id', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+# 标签共现次数（tag_a < tag_b，只统计 tag_pair_scope 中的高频标签，避免组合数爆炸）
+tag_pairs_table = Table(
+    'tag_pairs', Base.metadata,
+    Column('tag_a', Integer, primary_key=True),
+    Column('tag_b', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
+tag_pair_scope_table = Table(
+    'tag_pair_scope', Base.metadata,
+    Column('tag_id', Integer, primary_key=True)
+)
+
+# 标签倒排索引：每个标签对应的图片id（差分编码后zlib压缩），由 core.search 增量维护
+tag_postings_table = Table(
+    'tag_postings', Base.metadata,
+    Column('tag_id', Integer, primary_key=True),
+    Column('data', LargeBinary, nullable=False)
+)
+
+# 倒排索引状态（已建索引的最大图片id）
+search_meta_table = Table(
+    'search_meta', Base.metadata,
+    Column('key', String, primary_key=True),
+    Column('value', Integer)
+)
+
+# 已建索引的图片被 upsert 改动的标签关联（增加或删除），倒排索引下次刷新时据此修补
+search_dirty_table = Table(
+    'search_dirty', Base.metadata,
+    Column('image_id', Integer, primary_key=True),
+    Column('tag_id', Integer, primary_key=True)
+)
+
+# 画师名单（取代 artists_roster.txt）：用于从标签中识别画师，可导出为txt兼容旧工具
+roster_table = Table(
+    'artist_roster', Base.metadata,
+    Column('name', String, primary_key=True),
+    Column('source', String, nullable=False),               # txt / manual / danbooru
+    Column('posts', Integer, nullable=False, default=0)     # 从抓取数据中学习到的作品数
+)
+
 class Tag(Base):
     __tablename__ = 'tags'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -44,84 +109,515 @@ class Image(Base):
     height = Column(Integer)
     posted_at = Column(String)
 
+    # 同一网站的同一作品只存一份，写入时依赖该唯一索引做 upsert 去重
+    __table_args__ = (Index('ix_images_site_post_id', 'site', 'post_id', unique=True),)
+
     # 建立与 Tag 和 Artist 的多对多关系
     tags = relationship("Tag", secondary=image_tag_table, backref="images")
     artists = relationship("Artist", secondary=image_artist_table, backref="images")
 
 
+@dataclass
+class SQLiteProfile:
+    """SQLite连接参数，每个新连接建立时通过 PRAGMA 设置"""
+    journal_mode: str = "WAL"       # WAL：读写互不阻塞，提交只追加日志
+    synchronous: str = "NORMAL"     # WAL 下 NORMAL 不会损坏数据库，只在断电时可能丢失最近的提交
+    cache_size: int = -65536        # 页缓存，负数表示KiB（64MB）
+    mmap_size: int = 268435456      # 内存映射读取（256MB），0 为关闭
+    temp_store: str = "MEMORY"      # 临时表与排序放在内存中
+    bulk_synchronous: str = "OFF"   # 批量导入模式下的同步级别
+
+    def pragmas(self, bulk: bool = False) -> dict:
+        return {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.bulk_synchronous if bulk else self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "temp_store": self.temp_store,
+        }
+
+
 class DBManager:
-    def __init__(self, db_path: str):
+    # IN (...) 查询每块的参数个数（低于SQLite的变量数上限）
+    QUERY_CHUNK = 500
+    # 统计共现的高频标签数（重建统计时按出现次数选取，写入时随计数变化替换）
+    PAIR_SCOPE = 1000
+    # 范围已满时每写入多少批检查一次替换（替换进来的标签要扫描 image_tags 补算共现），
+    # 计数超过范围内最小计数的这个倍数才替换（避免边界附近的标签反复进出）
+    PAIR_SCOPE_REFRESH = 50
+    PAIR_SCOPE_MARGIN = 1.1
+    # 作品已存在时用新数据覆盖的字段
+    UPSERT_COLUMNS = ("file_url", "rating", "score", "width", "height", "posted_at")
+
+    def __init__(self, db_path: str, profile: SQLiteProfile = None):
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.profile = profile or SQLiteProfile()
+        self._bulk = False
+        # 写入时是否增量更新统计表（大批量导入时可关闭，导入后调用 rebuild_stats）
+        self.maintain_stats = True
+        self._stats_updates = 0
         self.engine = create_engine(f"sqlite:///{db_path}")
+        event.listen(self.engine, "connect", self._apply_pragmas)
+        existing_tables = set(inspect(self.engine).get_table_names())
         Base.metadata.create_all(self.engine)
+        self._migrate(existing_tables)
         self.Session = sessionmaker(bind=self.engine)
+        # 画师名 -> id 缓存（首次写入时从数据库加载）
+        self._artist_ids = None
+        self._load_vocab()
+
+    def _apply_pragmas(self, dbapi_conn, connection_record):
+        """新连接建立时应用性能参数"""
+        cursor = dbapi_conn.cursor()
+        for name, value in self.profile.pragmas(self._bulk).items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        批量导入模式：期间降低同步级别（断电可能丢失导入中的数据，但数据库不会损坏），
+        结束后恢复正常参数并把WAL日志合并回数据库文件
+        """
+        self._bulk = True
+        self.engine.dispose()
+        logger.debug(f"进入批量导入模式: synchronous={self.profile.bulk_synchronous}")
+        try:
+            yield self
+        finally:
+            self._bulk = False
+            self.engine.dispose()
+            with self.engine.connect() as conn:
+                if self.profile.journal_mode.upper() == "WAL":
+                    conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.debug("已退出批量导入模式")
+
+    def _migrate(self, existing_tables: set):
+        """旧数据库升级：补建 (site, post_id) 唯一索引，并为已有数据生成统计表"""
+        self._migrate_unique_index()
+        # 原本没有统计表的旧数据库，新建统计表后用已有数据填充一次
+        if "images" in existing_tables and "tag_stats" not in existing_tables:
+            self.rebuild_stats()
+
+    def _migrate_unique_index(self):
+        """补建 (site, post_id) 唯一索引：先清理重复作品（保留最早的一条），再建索引"""
+        index_names = {index["name"] for index in inspect(self.engine).get_indexes(Image.__tablename__)}
+        if 'ix_images_site_post_id' in index_names:
+            return
+
+        duplicates = "SELECT id FROM images WHERE id NOT IN (SELECT MIN(id) FROM images GROUP BY site, post_id)"
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM image_tags WHERE image_id IN ({duplicates})"))
+            conn.execute(text(f"DELETE FROM image_artists WHERE image_id IN ({duplicates})"))
+            removed = conn.execute(text(f"DELETE FROM images WHERE id IN ({duplicates})")).rowcount
+            for index in Image.__table__.indexes:
+                index.create(conn, checkfirst=True)
+        logger.info(f"数据库已升级：建立 (site, post_id) 唯一索引，清理重复图片 {removed} 条")
+
+    def _load_vocab(self):
+        """用 tags 表初始化进程内标签字典（字典id即 tags.id）"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(Tag.id, Tag.name)).all()
+        TAG_VOCAB.load(rows)
+
+    def _resolve_tags(self, conn, tags: list[set]) -> tuple[list[set], list[tuple[int, str]]]:
+        """
+        把批次中的临时标签id换成数据库id：新标签按名称插入（其他进程已插入同名标签时忽略），再查回数据库分配的id
+        返回 (换算后的标签id集合, 需要登记到标签字典的 (id, 标签名))，登记在事务提交后进行
+        """
+        provisional = {tag_id for tag_ids in tags for tag_id in tag_ids if TAG_VOCAB.is_provisional(tag_id)}
+        if not provisional:
+            return tags, []
+
+        mapping = {}
+        pending = {}
+        for tag_id in provisional:
+            name = TAG_VOCAB.name_of(tag_id)
+            current = TAG_VOCAB.ids[name]
+            # 同一标签可能已在之前的批次写库，字典中已是数据库id
+            if TAG_VOCAB.is_provisional(current):
+                pending.setdefault(name, []).append(tag_id)
+            else:
+                mapping[tag_id] = current
+
+        bound = []
+        if pending:
+            names = list(pending)
+            conn.execute(insert(Tag).on_conflict_do_nothing(index_elements=[Tag.name]), [{"name": name} for name in names])
+            for start in range(0, len(names), self.QUERY_CHUNK):
+                chunk = names[start:start + self.QUERY_CHUNK]
+                for name, db_id in conn.execute(select(Tag.name, Tag.id).where(Tag.name.in_(chunk))):
+                    bound.append((db_id, name))
+                    mapping.update(dict.fromkeys(pending[name], db_id))
+
+        return [{mapping.get(tag_id, tag_id) for tag_id in tag_ids} for tag_ids in tags], bound
+
+    def _resolve_artists(self, conn, names: set) -> dict:
+        """画师名 -> id：优先查缓存，缺失的先按名称批量查询，仍不存在的批量插入（同名已存在时忽略）"""
+        if self._artist_ids is None:
+            self._artist_ids = dict(conn.execute(select(Artist.name, Artist.id)).all())
+
+        resolved = {name: self._artist_ids[name] for name in names if name in self._artist_ids}
+        missing = list(names - resolved.keys())
+        # 名单可能被其他途径（如清洗脚本）改动过，插入前先确认一次
+        for start in range(0, len(missing), self.QUERY_CHUNK):
+            chunk = missing[start:start + self.QUERY_CHUNK]
+            resolved.update(conn.execute(select(Artist.name, Artist.id).where(Artist.name.in_(chunk))).all())
+
+        missing = [name for name in missing if name not in resolved]
+        if missing:
+            # 查询与插入之间其他进程可能已插入同名画师：忽略冲突后统一查回id
+            conn.execute(insert(Artist).on_conflict_do_nothing(index_elements=[Artist.name]), [{"name": name} for name in missing])
+            for start in range(0, len(missing), self.QUERY_CHUNK):
+                chunk = missing[start:start + self.QUERY_CHUNK]
+                resolved.update(conn.execute(select(Artist.name, Artist.id).where(Artist.name.in_(chunk))).all())
+        return resolved
 
-    def _get_or_create(self, session, model, **kwargs):
-        """获取或创建记录：若不存在则新建"""
-        with session.no_autoflush:
-            instance = session.query(model).filter_by(**kwargs).first()
-            if not instance:
-                instance = model(**kwargs)
-                session.add(instance)
-            return instance
+    def load_links(self, conn, table: str, column: str, image_ids: list) -> dict[int, set]:
+        """读取指定图片在关联表中的现有关联：图片id -> 关联id集合"""
+        links = {}
+        for start in range(0, len(image_ids), self.QUERY_CHUNK):
+            chunk = image_ids[start:start + self.QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.exec_driver_sql(
+                f"SELECT image_id, {column} FROM {table} WHERE image_id IN ({placeholders})", tuple(chunk)
+            )
+            for image_id, link_id in rows:
+                links.setdefault(image_id, set()).add(link_id)
+        return links
+
+    def save_rows(self, rows: list[dict], artists: list[set], tags: list[set]) -> tuple[int, int]:
+        """
+        批量写入已整理好的数据，按 (site, post_id) upsert：新作品插入，已有作品更新分数等字段，并用新数据替换其画师/标签关联
+        rows 为 images 表字段字典，artists / tags 为对应的画师名集合与标签id（即 tags.id）集合
+        返回 (新增数, 更新数)
+        """
+        # 批次内重复的 (site, post_id) 只保留最后一条；与库中已有数据的去重交给唯一索引
+        latest = {(row["site"], row["post_id"]): i for i, row in enumerate(rows)}
+        if len(latest) < len(rows):
+            keep = sorted(latest.values())
+            rows = [rows[i] for i in keep]
+            artists = [artists[i] for i in keep]
+            tags = [tags[i] for i in keep]
+
+        with self.engine.begin() as conn:
+            # 新插入行的主键必然大于当前最大id，借此区分插入与更新
+            last_id = conn.execute(select(func.max(Image.id))).scalar() or 0
+            artist_ids = self._resolve_artists(conn, set().union(*artists))
+
+            tags, new_tags = self._resolve_tags(conn, tags)
+
+            stmt = insert(Image)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Image.site, Image.post_id],
+                set_={column: stmt.excluded[column] for column in self.UPSERT_COLUMNS}
+            )
+            image_ids = conn.execute(stmt.returning(Image.id, sort_by_parameter_order=True), rows).scalars().all()
+
+            # 已有作品（走冲突更新的行）先读出现有关联，用新数据整体替换
+            existing_ids = [image_id for image_id in image_ids if image_id <= last_id]
+            old_artists = self.load_links(conn, "image_artists", "artist_id", existing_ids)
+            old_tags = self.load_links(conn, "image_tags", "tag_id", existing_ids)
+            unknown_id = artist_ids.get("Unknown")
+
+            artist_links, tag_links = [], []
+            removed_artist_links, removed_tag_links = [], []
+            # 统计表增量：关联有变化的作品先减去旧的 (画师, 标签)，再加上新的
+            stats_added, stats_removed = [], []
+            for image_id, names, tag_ids in zip(image_ids, artists, tags):
+                new_artists = {artist_ids[name] for name in names}
+                # 有真实画师时不关联 Unknown；只有 Unknown 兜底时保留库中已有的真实画师
+                if unknown_id is not None and unknown_id in new_artists:
+                    if len(new_artists) > 1:
+                        new_artists.discard(unknown_id)
+                    elif old_artists.get(image_id, set()) - {unknown_id}:
+                        new_artists = old_artists[image_id] - {unknown_id}
+                current_artists = old_artists.get(image_id, set())
+                current_tags = old_tags.get(image_id, set())
+                artist_links.extend((image_id, artist_id) for artist_id in new_artists - current_artists)
+                tag_links.extend((image_id, tag_id) for tag_id in tag_ids - current_tags)
+                removed_artist_links.extend((image_id, artist_id) for artist_id in current_artists - new_artists)
+                removed_tag_links.extend((image_id, tag_id) for tag_id in current_tags - tag_ids)
+                if new_artists != current_artists or tag_ids != current_tags:
+                    stats_added.append((new_artists, tag_ids))
+                    if image_id <= last_id:
+                        stats_removed.append((current_artists, current_tags))
+
+            # 关联表行数是图片的几十倍，直接用驱动的 executemany 处理元组，省去逐行构造参数的开销
+            if removed_artist_links:
+                conn.exec_driver_sql("DELETE FROM image_artists WHERE image_id = ? AND artist_id = ?", removed_artist_links)
+            if removed_tag_links:
+                conn.exec_driver_sql("DELETE FROM image_tags WHERE image_id = ? AND tag_id = ?", removed_tag_links)
+            if artist_links:
+                conn.exec_driver_sql("INSERT OR IGNORE INTO image_artists (image_id, artist_id) VALUES (?, ?)", artist_links)
+            if tag_links:
+                conn.exec_driver_sql("INSERT OR IGNORE INTO image_tags (image_id, tag_id) VALUES (?, ?)", tag_links)
+            self._mark_search_dirty(conn, removed_tag_links + [link for link in tag_links if link[0] <= last_id])
+
+            if self.maintain_stats:
+                self._update_stats(conn, stats_added, stats_removed)
+
+        # 事务提交成功后再更新缓存（回滚时数据库分配的id无效）
+        TAG_VOCAB.load(new_tags)
+        self._artist_ids.update(artist_ids)
+        inserted = sum(1 for image_id in image_ids if image_id > last_id)
+        return inserted, len(image_ids) - inserted
+
+    def _mark_search_dirty(self, conn, changed_links: list[tuple[int, int]]):
+        """记录已建倒排索引的图片中有变化的标签关联（未建索引时不记录）"""
+        if not changed_links:
+            return
+        watermark = conn.exec_driver_sql("SELECT value FROM search_meta WHERE key = 'indexed_image_id'").scalar()
+        if not watermark:
+            return
+        dirty = [link for link in changed_links if link[0] <= watermark]
+        if dirty:
+            conn.exec_driver_sql("INSERT OR IGNORE INTO search_dirty (image_id, tag_id) VALUES (?, ?)", dirty)
+
+    def _update_stats(self, conn, added: list[tuple[set, set]], removed: list[tuple[set, set]] = ()):
+        """按作品的 (画师id集合, 标签id集合) 增量更新统计表：added 累加，removed 扣减，计数归零的行删除"""
+        if not added and not removed:
+            return
+
+        tag_counts = Counter()
+        artist_counts = Counter()
+        for sign, images in ((1, added), (-1, removed)):
+            for artist_ids, tag_ids in images:
+                for tag_id in tag_ids:
+                    tag_counts[tag_id] += sign
+                    for artist_id in artist_ids:
+                        artist_counts[artist_id, tag_id] += sign
+        self._apply_deltas(conn, "tag_stats", ("tag_id",), tag_counts)
+        self._apply_deltas(conn, "artist_tag_stats", ("artist_id", "tag_id"), artist_counts)
+
+        scope, backfill = self._refresh_pair_scope(conn, tag_counts)
+        pair_counts = Counter()
+        for sign, images in ((1, added), (-1, removed)):
+            for _, tag_ids in images:
+                for pair in combinations(sorted(tag_ids & scope), 2):
+                    pair_counts[pair] += sign
+        self._apply_deltas(conn, "tag_pairs", ("tag_a", "tag_b"), pair_counts)
+        if backfill:
+            self._backfill_pairs(conn, backfill)
+
+    def _apply_deltas(self, conn, table: str, keys: tuple, counts: Counter):
+        # 同一作品前后都有的组合会相互抵消
+        deltas = [(*(key if isinstance(key, tuple) else (key,)), count) for key, count in counts.items() if count]
+        if not deltas:
+            return
+        columns = ", ".join(keys)
+        conn.exec_driver_sql(
+            f"INSERT INTO {table} ({columns}, count) VALUES ({', '.join('?' * (len(keys) + 1))}) "
+            f"ON CONFLICT({columns}) DO UPDATE SET count = count + excluded.count",
+            deltas
+        )
+        decreased = [delta[:-1] for delta in deltas if delta[-1] < 0]
+        if decreased:
+            conn.exec_driver_sql(
+                f"DELETE FROM {table} WHERE {' AND '.join(f'{key} = ?' for key in keys)} AND count <= 0",
+                decreased
+            )
+
+    def _refresh_pair_scope(self, conn, tag_counts: Counter) -> tuple[set, list]:
+        """
+        计数增加的标签调整共现统计范围：范围未满时直接加入，已满时定期把计数明显超过范围内最小计数的替换进来
+        返回 (按本批次作品累计共现的标签, 需要从 image_tags 补算共现的标签)；本批次之前就有作品的标签只能补算
+        """
+        scope = dict(conn.exec_driver_sql(
+            "SELECT s.tag_id, COALESCE(t.count, 0) FROM tag_pair_scope s LEFT JOIN tag_stats t ON t.tag_id = s.tag_id"
+        ).all())
+        # 重建时指定过更大的范围则沿用
+        limit = max(self.PAIR_SCOPE, len(scope))
+        check_swap = self._stats_updates % self.PAIR_SCOPE_REFRESH == 0
+        self._stats_updates += 1
+        grown = [tag_id for tag_id, delta in tag_counts.items() if delta > 0 and tag_id not in scope]
+        if not grown or (len(scope) >= limit and not check_swap):
+            return set(scope), []
+
+        counts = {}
+        for start in range(0, len(grown), self.QUERY_CHUNK):
+            chunk = grown[start:start + self.QUERY_CHUNK]
+            counts.update(conn.exec_driver_sql(
+                f"SELECT tag_id, count FROM tag_stats WHERE tag_id IN ({', '.join('?' * len(chunk))})", tuple(chunk)
+            ).all())
+
+        lowest = [(count, tag_id) for tag_id, count in scope.items()]
+        heapq.heapify(lowest)
+        admitted, evicted = [], []
+        for tag_id in sorted(grown, key=counts.get, reverse=True):
+            count = counts[tag_id]
+            if len(scope) >= limit:
+                if not check_swap or count <= lowest[0][0] * self.PAIR_SCOPE_MARGIN:
+                    break
+                # 候选按计数从高到低处理，被替换的总是原有的标签
+                _, removed_id = heapq.heappop(lowest)
+                del scope[removed_id]
+                evicted.append(removed_id)
+            scope[tag_id] = count
+            heapq.heappush(lowest, (count, tag_id))
+            admitted.append(tag_id)
+
+        for start in range(0, len(evicted), self.QUERY_CHUNK // 2):
+            chunk = tuple(evicted[start:start + self.QUERY_CHUNK // 2])
+            marks = ", ".join("?" * len(chunk))
+            conn.exec_driver_sql(f"DELETE FROM tag_pair_scope WHERE tag_id IN ({marks})", chunk)
+            conn.exec_driver_sql(f"DELETE FROM tag_pairs WHERE tag_a IN ({marks}) OR tag_b IN ({marks})", chunk + chunk)
+        if admitted:
+            conn.exec_driver_sql("INSERT INTO tag_pair_scope (tag_id) VALUES (?)", [(tag_id,) for tag_id in admitted])
+            logger.debug(f"共现统计范围加入 {len(admitted)} 个标签，移出 {len(evicted)} 个")
+
+        # 计数全部来自本批次的标签（新标签）可直接按本批次作品累计
+        backfill = [tag_id for tag_id in admitted if counts[tag_id] > tag_counts[tag_id]]
+        return set(scope) - set(backfill), backfill
+
+    def _backfill_pairs(self, conn, tag_ids: list):
+        """从 image_tags 补算新加入共现统计范围的标签与范围内其他标签的共现次数（需扫描 image_tags）"""
+        for start in range(0, len(tag_ids), self.QUERY_CHUNK // 2):
+            chunk = tuple(tag_ids[start:start + self.QUERY_CHUNK // 2])
+            marks = ", ".join("?" * len(chunk))
+            # 两个标签都需补算时只在 a < b 时计一次
+            conn.exec_driver_sql(
+                "INSERT INTO tag_pairs (tag_a, tag_b, count) "
+                "SELECT MIN(a.tag_id, b.tag_id), MAX(a.tag_id, b.tag_id), COUNT(*) FROM image_tags a "
+                "JOIN image_tags b ON b.image_id = a.image_id AND b.tag_id != a.tag_id "
+                f"WHERE a.tag_id IN ({marks}) AND b.tag_id IN (SELECT tag_id FROM tag_pair_scope) "
+                f"AND (b.tag_id NOT IN ({marks}) OR b.tag_id > a.tag_id) "
+                "GROUP BY 1, 2 "
+                "ON CONFLICT(tag_a, tag_b) DO UPDATE SET count = excluded.count",
+                chunk + chunk
+            )
+
+    def rebuild_stats(self, pair_scope: int = None):
+        """用 image_tags / image_artists 全量重建统计表，共现统计取出现次数最多的 pair_scope 个标签"""
+        pair_scope = pair_scope or self.PAIR_SCOPE
+        with self.engine.begin() as conn:
+            for table in ("tag_stats", "artist_tag_stats", "tag_pairs", "tag_pair_scope"):
+                conn.exec_driver_sql(f"DELETE FROM {table}")
+            conn.exec_driver_sql(
+                "INSERT INTO tag_stats (tag_id, count) SELECT tag_id, COUNT(*) FROM image_tags GROUP BY tag_id"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO artist_tag_stats (artist_id, tag_id, count) "
+                "SELECT ia.artist_id, it.tag_id, COUNT(*) FROM image_artists ia "
+                "JOIN image_tags it ON it.image_id = ia.image_id GROUP BY ia.artist_id, it.tag_id"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO tag_pair_scope (tag_id) SELECT tag_id FROM tag_stats ORDER BY count DESC LIMIT ?",
+                (pair_scope,)
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO tag_pairs (tag_a, tag_b, count) "
+                "SELECT a.tag_id, b.tag_id, COUNT(*) FROM image_tags a "
+                "JOIN image_tags b ON b.image_id = a.image_id AND b.tag_id > a.tag_id "
+                "WHERE a.tag_id IN (SELECT tag_id FROM tag_pair_scope) AND b.tag_id IN (SELECT tag_id FROM tag_pair_scope) "
+                "GROUP BY a.tag_id, b.tag_id"
+            )
+        logger.info("统计表重建完成")
+
+    def top_tags(self, limit: int = 50, artist: str = None) -> list[tuple[str, int]]:
+        """出现次数最多的标签（可限定画师），直接读取统计表"""
+        with self.engine.connect() as conn:
+            if artist is None:
+                rows = conn.exec_driver_sql(
+                    "SELECT t.name, s.count FROM tag_stats s JOIN tags t ON t.id = s.tag_id ORDER BY s.count DESC LIMIT ?",
+                    (limit,)
+                )
+            else:
+                rows = conn.exec_driver_sql(
+                    "SELECT t.name, s.count FROM artist_tag_stats s JOIN tags t ON t.id = s.tag_id "
+                    "WHERE s.artist_id = (SELECT id FROM artists WHERE name = ?) ORDER BY s.count DESC LIMIT ?",
+                    (artist, limit)
+                )
+            return [tuple(row) for row in rows]
+
+    def co_occurring_tags(self, tag: str, limit: int = 20) -> list[tuple[str, int]]:
+        """与指定标签共同出现最多的标签（仅限共现统计范围内的高频标签）"""
+        with self.engine.connect() as conn:
+            tag_id = conn.exec_driver_sql("SELECT id FROM tags WHERE name = ?", (tag,)).scalar()
+            if tag_id is None:
+                return []
+            rows = conn.exec_driver_sql(
+                "SELECT t.name, p.count FROM ("
+                "  SELECT tag_b AS other, count FROM tag_pairs WHERE tag_a = :id"
+                "  UNION ALL SELECT tag_a AS other, count FROM tag_pairs WHERE tag_b = :id"
+                ") p JOIN tags t ON t.id = p.other ORDER BY p.count DESC LIMIT :limit",
+                {"id": tag_id, "limit": limit}
+            )
+            return [tuple(row) for row in rows]
+
+    # ---------------- 画师名单 ----------------
+    def roster_names(self) -> set[str]:
+        with self.engine.connect() as conn:
+            return set(conn.exec_driver_sql("SELECT name FROM artist_roster").scalars())
+
+    def roster_contains(self, names) -> set[str]:
+        """批量判断哪些名称在画师名单中（按块查询主键）"""
+        names = list(set(names))
+        found = set()
+        with self.engine.connect() as conn:
+            for start in range(0, len(names), self.QUERY_CHUNK):
+                chunk = names[start:start + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.exec_driver_sql(
+                    f"SELECT name FROM artist_roster WHERE name IN ({placeholders})", tuple(chunk)
+                ).scalars())
+        return found
+
+    def stored_post_ids(self, site: str, post_ids) -> set[int]:
+        """批量判断指定站点的哪些作品id已经入库（按块查询唯一索引）"""
+        post_ids = list(set(post_ids))
+        found = set()
+        with self.engine.connect() as conn:
+            for start in range(0, len(post_ids), self.QUERY_CHUNK):
+                chunk = post_ids[start:start + self.QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.exec_driver_sql(
+                    f"SELECT post_id FROM images WHERE site = ? AND post_id IN ({placeholders})", (site, *chunk)
+                ).scalars())
+        return found
+
+    def add_to_roster(self, counts: dict[str, int], source: str) -> list[str]:
+        """批量登记画师（名称 -> 本次学习到的作品数），已存在的累加作品数，返回新增的名称"""
+        if not counts:
+            return []
+        existing = self.roster_contains(counts)
+        new_names = [name for name in counts if name not in existing]
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO artist_roster (name, source, posts) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET posts = posts + excluded.posts",
+                [(name, source, count) for name, count in counts.items()]
+            )
+        return new_names
 
     def save_items(self, image_items: list[ImageItem]):
-        """将爬取到的 ImageItem 列表存入数据库"""
+        """将爬取到的 ImageItem 列表批量存入数据库"""
         if not image_items:
             return
 
-        session = self.Session()
-        new_count = 0
+        rows = [{
+            "post_id": item.id,
+            "site": str(item.site),
+            "file_url": item.url,
+            "rating": str(item.rating),
+            "score": int(item.score) if item.score else 0,
+            "width": int(item.width) if item.width else 0,
+            "height": int(item.height) if item.height else 0,
+            "posted_at": item.created_at,
+        } for item in image_items]
+        # 画师按逗号分割、标签使用字典编码后的id，均去重
+        artists = [
+            {a.strip() for a in item.artist.split(',') if a.strip()} if item.artist else {"Unknown"}
+            for item in image_items
+        ]
+        tags = [set(item.encode_tags()) for item in image_items]
 
         try:
-            for item in image_items:
-                # 去重：检查该网站的该 post_id 是否已存在
-                exists = session.query(Image.id).filter_by(post_id=item.id, site=item.site).first()
-                if exists:
-                    continue
-
-                new_image = Image(
-                    post_id=item.id,
-                    site=item.site,
-                    file_url=item.url,
-                    rating=item.rating,
-                    score=int(item.score) if item.score else 0,
-                    width=int(item.width) if item.width else 0,
-                    height=int(item.height) if item.height else 0,
-                    posted_at=item.created_at
-                )
+            inserted, updated = self.save_rows(rows, artists, tags)
+            if inserted:
+                logger.info(f"成功保存 {inserted} 张新图片及其关系到数据库")
+            if updated:
+                logger.info(f"更新 {updated} 张已有图片的数据")
 
-                # 处理画师（按逗号分割，去重）
-                raw_artists = [a.strip() for a in item.artist.split(',')] if item.artist else ['Unknown']
-                artist_names = list(set(raw_artists))
-                
-                for a_name in artist_names:
-                    if a_name:
-                        artist_obj = self._get_or_create(session, Artist, name=a_name)
-                        new_image.artists.append(artist_obj)
-
-                # 处理标签（按空格分割，去重）
-                raw_tags = [t.strip() for t in item.tags.split(' ')] if item.tags else []
-                tag_names = list(set(raw_tags))
-                
-                for t_name in tag_names:
-                    if t_name:
-                        tag_obj = self._get_or_create(session, Tag, name=t_name)
-                        new_image.tags.append(tag_obj)
-
-                session.add(new_image)
-                new_count += 1
-
-            session.commit()
-            if new_count > 0:
-                logger.info(f"成功保存 {new_count} 张新图片及其关系到数据库")
-                
-            else:
-                logger.info(f"该批次没有新图片及其关系需要保存到数据库")
-            
         except Exception as e:
-            session.rollback()
             logger.error(f"数据库保存失败: {e}")
-            
-        finally:
-            session.close()
\ No newline at end of file
@@ -0,0 +1,162 @@
+import os
+import uuid
+from typing import List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from core.models import ImageItem
+from core.idindex import IdIndex, make_keys
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pyarrow 为可选依赖，只有使用 Parquet 数据集时才需要安装
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# 列与CSV汇总表一致，另加 Query（抓取时的检索名，即单独CSV的文件名）与 Month（由 Posted 派生，可用于分区）
+COLUMNS = ["Id", "Site", "Posted", "Artist", "Rating", "Score", "Size", "File_URL", "Tags", "Query", "Month"]
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("使用 Parquet 数据集需要安装 pyarrow: pip install pyarrow")
+
+
+def _schema():
+    return pa.schema([
+        ("Id", pa.int64()), ("Site", pa.string()), ("Posted", pa.string()), ("Artist", pa.string()),
+        ("Rating", pa.string()), ("Score", pa.int64()), ("Size", pa.string()), ("File_URL", pa.string()),
+        ("Tags", pa.string()), ("Query", pa.string()), ("Month", pa.string()),
+    ])
+
+
+class _DatasetIdIndex(IdIndex):
+    """Parquet数据集的 (site, id) 索引，保存在数据集目录的 _index 下（下划线开头的目录不会被当作数据读取）"""
+
+    def __init__(self, dataset: "ParquetDataset"):
+        self.dataset = dataset
+        index_dir = os.path.join(dataset.root, "_index")
+        os.makedirs(index_dir, exist_ok=True)
+        super().__init__(dataset.root, os.path.join(index_dir, "ids"))
+
+    def _source_stat(self):
+        files = self.dataset.files()
+        if not files:
+            return None
+        return [len(files), sum(os.path.getsize(f) for f in files)]
+
+    def _iter_source(self):
+        for batch in self.dataset.iter_batches(columns=["Id", "Site"]):
+            yield batch.to_pandas()
+
+
+class ParquetDataset:
+    """
+    按站点分区（可再按 Query / Month / Artist 等列分区）的 Parquet 数据集，作为追加式CSV的列式替代
+    读取时只解码需要的列，并把过滤条件下推到分区目录与行组统计信息
+    """
+
+    def __init__(self, root: str, partition_by: Sequence[str] = ("Site",), flush_rows: int = 50000):
+        _require_pyarrow()
+        unknown = [c for c in partition_by if c not in COLUMNS]
+        if unknown:
+            raise ValueError(f"无效的分区列: {unknown}，可选: {COLUMNS}")
+        self.root = root
+        self.partition_by = list(partition_by)
+        self.flush_rows = flush_rows
+        self._buffer: List[dict] = []
+        self._pending_keys: List[np.ndarray] = []
+        self._index: Optional[IdIndex] = None
+
+    # ---------------- 写入 ----------------
+    @property
+    def index(self) -> IdIndex:
+        if self._index is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._index = _DatasetIdIndex(self)
+        return self._index
+
+    def write(self, image_items: List[ImageItem], artist: str = "", query: str = "") -> int:
+        """按 (site, id) 去重后写入缓冲区，攒够 flush_rows 行再落盘（避免每页一个小文件），返回新增条数"""
+        if not image_items:
+            return 0
+
+        keys = make_keys((item.site for item in image_items), (item.id for item in image_items))
+        new_positions = self.index.filter_new(keys)
+        if self._pending_keys and len(new_positions):
+            pending = np.concatenate(self._pending_keys)
+            new_positions = new_positions[~np.isin(keys[new_positions], pending)]
+        if not len(new_positions):
+            return 0
+
+        for i in new_positions:
+            row = image_items[i].to_dict(artist=artist)
+            row["Query"] = query
+            row["Month"] = row["Posted"][:7] if row["Posted"] else ""
+            self._buffer.append(row)
+        self._pending_keys.append(keys[new_positions])
+
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+        return len(new_positions)
+
+    def flush(self) -> None:
+        """把缓冲区写成新的 Parquet 文件（每个分区一个），成功后再登记到索引"""
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=_schema())
+        pq.write_to_dataset(
+            table,
+            root_path=self.root,
+            partition_cols=self.partition_by or None,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        self.index.add(np.concatenate(self._pending_keys))
+        logger.debug(f"写入 Parquet 数据集 {len(self._buffer)} 条: {self.root}")
+        self._buffer = []
+        self._pending_keys = []
+
+    def close(self) -> None:
+        self.flush()
+
+    # ---------------- 读取 ----------------
+    def _dataset(self):
+        schema = _schema()
+        partitioning = ds.partitioning(pa.schema([schema.field(c) for c in self.partition_by]), flavor="hive")
+        return ds.dataset(self.root, format="parquet", partitioning=partitioning, ignore_prefixes=[".", "_"])
+
+    def files(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return list(self._dataset().files)
+
+    def count(self, filters=None) -> int:
+        """行数（无过滤条件时只读文件元数据）"""
+        if not self.files():
+            return 0
+        return self._dataset().count_rows(filter=self._expression(filters))
+
+    def _expression(self, filters):
+        """[("Site", "=", "Danbooru"), ("Score", ">", 10)] 形式的条件 -> pyarrow 表达式"""
+        if filters is None or isinstance(filters, ds.Expression):
+            return filters
+        return pq.filters_to_expression(filters)
+
+    def iter_batches(self, columns: Optional[List[str]] = None, filters=None, batch_size: int = 100000):
+        """按批流式读取，只解码 columns 指定的列，filters 会下推到分区与行组"""
+        if not self.files():
+            return
+        scanner = self._dataset().scanner(columns=columns, filter=self._expression(filters), batch_size=batch_size)
+        yield from scanner.to_batches()
+
+    def read(self, columns: Optional[List[str]] = None, filters=None) -> pd.DataFrame:
+        """读取为 DataFrame，例如 read(["Tags"], [("Query", "=", "xxx")])"""
+        if not self.files():
+            return pd.DataFrame(columns=columns or COLUMNS)
+        table = self._dataset().to_table(columns=columns, filter=self._expression(filters))
+        return table.to_pandas()
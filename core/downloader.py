@@ -2,25 +2,22 @@ import os
 import asyncio
 import aiohttp
 import aiofiles
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    TaskProgressColumn,
-    MofNCompleteColumn,
-    TimeRemainingColumn
-)
-from core.log_config import console
-from typing import List
+from contextlib import AsyncExitStack, nullcontext
+from rich.progress import Progress
+from core.log_config import create_progress
+from typing import List, Optional
 from core.models import ImageItem
+from core.retry import RetryEngine, RetryPolicy, HTTPStatusError, parse_retry_after
+from core.ratelimit import RateLimiter, shared_limiter
+from core.http import HttpClient, client_scope
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Downloader:
-    def __init__(self, save_path, artist, tags, headers, proxy, semaphore_limit=5):
+    def __init__(self, save_path, artist, tags, headers, proxy, semaphore_limit=5, retry_policy: RetryPolicy = None, rate_limiter: RateLimiter = None, http: HttpClient = None):
         self.save_path = save_path
+        self.semaphore_limit = semaphore_limit
         self.semaphore = asyncio.Semaphore(semaphore_limit)
 
         if artist:
@@ -32,60 +29,63 @@ class Downloader:
 
         self.proxy = proxy
         self.headers = headers
-        self.last_request_time = 0
-        self.request_interval = 0.1
-        
-
-    async def _download_one(self, session, item: ImageItem, filepath: str, progress, task_id):
-        """单个图片下载协程"""
+        self.rate_limiter = rate_limiter or shared_limiter
+        # 共享的HTTP客户端；为空时每次下载临时创建
+        self.http = http
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failed_items: List[ImageItem] = []
+
+    async def _request_one(self, client, item: ImageItem, filepath: str):
+        """单次下载请求，失败时抛出异常交给重试引擎"""
         async with self.semaphore:
-            # --- 核心限速逻辑 ---
-            now = asyncio.get_event_loop().time()
-            wait_time = self.last_request_time + self.request_interval - now
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-            self.last_request_time = asyncio.get_event_loop().time()
-            # ------------------
+            # 按图片所在 host 限速（与元数据抓取共用限速器）
+            await self.rate_limiter.acquire(item.url)
             
-            try:
-                logger.debug(f"开始下载: {item.filename}")
-                timeout = aiohttp.ClientTimeout(
-                    connect=10,
-                    sock_read=30,
-                    total=None,
-                )
-
-                async with session.get(item.url, headers=self.headers, proxy=self.proxy, timeout=timeout) as response:
-                    if response.status == 200:
-                        async with aiofiles.open(filepath, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(128 * 1024):
-                                await f.write(chunk)
-
-                        logger.debug(f"下载成功: {item.filename}")
-                        return True
-                    else:
-                        logger.warning(f"[HTTP {response.status}] {item.filename}")
-                        return False
-                    
-            except asyncio.TimeoutError:
-                logger.warning(f"[超时失败] {item.filename} : {item.source} 网络连接或读取数据超时")
-                return False
-            except Exception as e:
-                logger.warning(f"[下载失败] {item.filename} : {item.source} {e}")
-                return False
-
-            finally:
-                progress.update(task_id, advance=1)
-
-    async def _download_batch(self, image_items: List[ImageItem], download_videos: bool):
-        """异步批量下载主逻辑"""
-        if not image_items:
-            logger.info("没有图片需要下载")
-            return
+            logger.debug(f"开始下载: {item.filename}")
+            timeout = aiohttp.ClientTimeout(
+                connect=10,
+                sock_read=30,
+                total=None,
+            )
 
-        os.makedirs(self.save_dir, exist_ok=True)
-        existing_files = set(os.listdir(self.save_dir))
-        
+            try:
+                async with client.get(item.url, headers=self.headers, timeout=timeout) as response:
+                    if response.status != 200:
+                        raise HTTPStatusError(response.status, parse_retry_after(response.headers.get("Retry-After")))
+
+                    async with aiofiles.open(filepath, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(128 * 1024):
+                            await f.write(chunk)
+            except BaseException:
+                # 删除写了一半的文件，避免下次运行被当作已下载
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                raise
+
+            logger.debug(f"下载成功: {item.filename}")
+            return True
+
+    async def _download_one(self, client, item: ImageItem, filepath: str, retry: RetryEngine, progress, task_id):
+        """单个图片下载协程（带重试）"""
+        try:
+            return await retry.call(
+                lambda: self._request_one(client, item, filepath),
+                label=item.filename
+            )
+        except HTTPStatusError as e:
+            logger.warning(f"[HTTP {e.status}] {item.filename}")
+        except asyncio.TimeoutError:
+            logger.warning(f"[超时失败] {item.filename} : {item.source} 网络连接或读取数据超时")
+        except Exception as e:
+            logger.warning(f"[下载失败] {item.filename} : {item.source} {e}")
+        finally:
+            progress.update(task_id, advance=1)
+
+        self.failed_items.append(item)
+        return False
+
+    def _plan_downloads(self, image_items: List[ImageItem], download_videos: bool, existing_files: set) -> list:
+        """过滤视频/已存在/无URL的条目，返回 (item, filepath) 列表"""
         tasks_data = []
         video_filtered_count = 0
 
@@ -102,6 +102,29 @@ class Downloader:
 
         if video_filtered_count > 0:
             logger.debug(f"根据配置跳过了 {video_filtered_count} 个视频文件")
+        return tasks_data
+
+    def _log_summary(self, total_img_task, total_vid_task, success_img, success_vid):
+        if total_img_task > 0:
+            logger.info(f"图片: {success_img}/{total_img_task} 成功")
+        if total_vid_task > 0:
+            logger.info(f"视频: {success_vid}/{total_vid_task} 成功")
+        
+        total_success = success_img + success_vid
+        logger.info(f"总计成功: {total_success}/{total_img_task + total_vid_task}")
+        if self.failed_items:
+            logger.warning(f"{len(self.failed_items)} 个文件在重试后仍失败，可用 failed_items 重新下载")
+        logger.info(f"保存位置: {self.save_dir}")
+
+    async def _download_batch(self, image_items: List[ImageItem], download_videos: bool):
+        """异步批量下载主逻辑"""
+        if not image_items:
+            logger.info("没有图片需要下载")
+            return
+
+        os.makedirs(self.save_dir, exist_ok=True)
+        existing_files = set(os.listdir(self.save_dir))
+        tasks_data = self._plan_downloads(image_items, download_videos, existing_files)
 
         if not tasks_data:
             logger.debug("所有符合条件的文件均已存在或被跳过")
@@ -111,24 +134,16 @@ class Downloader:
         total_vid_task = sum(1 for item, _ in tasks_data if item.is_video)
 
         logger.info(f"开始下载任务: [图片: {total_img_task} | 视频: {total_vid_task}]")
+        retry = RetryEngine(self.retry_policy)
+        self.failed_items = []
+
+        async with client_scope(self.http, self.proxy) as client:
+            with create_progress() as progress:
 
-        async with aiohttp.ClientSession() as session:
-            with Progress(
-                TextColumn("        "),
-                SpinnerColumn(),
-                TextColumn("[bold blue]{task.description:<20}"),
-                BarColumn(),
-                MofNCompleteColumn(),
-                TaskProgressColumn(),
-                TimeRemainingColumn(),
-                console=console,
-                transient=False  
-            ) as progress:
-
-                download_task = progress.add_task("正在下载数据中...", total=len(tasks_data))
+                download_task = progress.add_task("正在下载数据中...", total=len(tasks_data), style="bold blue")
                 
                 tasks = [
-                    self._download_one(session, item, filepath, progress, download_task)
+                    self._download_one(client, item, filepath, retry, progress, download_task)
                     for item, filepath in tasks_data
                 ]
 
@@ -144,14 +159,11 @@ class Downloader:
                 else:
                     success_img += 1
 
-        if total_img_task > 0:
-            logger.info(f"图片: {success_img}/{total_img_task} 成功")
-        if total_vid_task > 0:
-            logger.info(f"视频: {success_vid}/{total_vid_task} 成功")
-        
-        total_success = success_img + success_vid
-        logger.info(f"总计成功: {total_success}/{len(tasks_data)}")
-        logger.info(f"保存位置: {self.save_dir}")
+        self._log_summary(total_img_task, total_vid_task, success_img, success_vid)
+
+    def stream(self, download_videos: bool, queue_size: int = 200, progress: Optional[Progress] = None) -> "DownloadStream":
+        """创建边抓取边下载的流式下载会话"""
+        return DownloadStream(self, download_videos, queue_size, progress)
 
     def download(self, image_items: List[ImageItem], download_videos: bool):
         """供 run.py 直接调用的同步入口"""
@@ -161,3 +173,75 @@ class Downloader:
         except RuntimeError:
             loop = asyncio.get_event_loop()
             loop.run_until_complete(self._download_batch(image_items, download_videos))
+
+
+class DownloadStream:
+    """
+    边抓取边下载：抓取端通过 submit 提交每页条目，固定数量的下载协程从有界队列取任务
+    队列满时 submit 会等待，磁盘或网络慢时自然反压元数据抓取
+    """
+
+    def __init__(self, downloader: Downloader, download_videos: bool, queue_size: int = 200, progress: Optional[Progress] = None):
+        self.downloader = downloader
+        self.download_videos = download_videos
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.progress = progress
+        self.workers = []
+        self.seen_files = set()
+        self.total_jobs = 0
+        self.counts = {"img": 0, "vid": 0, "img_ok": 0, "vid_ok": 0}
+
+    async def __aenter__(self):
+        dl = self.downloader
+        os.makedirs(dl.save_dir, exist_ok=True)
+        self.seen_files = set(os.listdir(dl.save_dir))
+        dl.failed_items = []
+        self.retry = RetryEngine(dl.retry_policy)
+        self._stack = AsyncExitStack()
+        self.client = await self._stack.enter_async_context(client_scope(dl.http, dl.proxy))
+        self.progress = self._stack.enter_context(nullcontext(self.progress) if self.progress else create_progress())
+        self.task_id = self.progress.add_task("正在下载数据中...", total=0, style="bold blue")
+        # 下载协程数与下载器的并发上限一致，真正的并发仍由 semaphore 控制
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(dl.semaphore_limit)]
+        return self
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job is None:
+                return
+            item, filepath = job
+            ok = await self.downloader._download_one(self.client, item, filepath, self.retry, self.progress, self.task_id)
+            if ok:
+                self.counts["vid_ok" if item.is_video else "img_ok"] += 1
+
+    async def submit(self, items: List[ImageItem]) -> None:
+        """提交一页条目，队列已满时等待下载腾出空间"""
+        tasks_data = self.downloader._plan_downloads(items, self.download_videos, self.seen_files)
+        if not tasks_data:
+            return
+        self.total_jobs += len(tasks_data)
+        self.progress.update(self.task_id, total=self.total_jobs)
+        for item, filepath in tasks_data:
+            self.seen_files.add(item.filename)
+            self.counts["vid" if item.is_video else "img"] += 1
+            await self.queue.put((item, filepath))
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                for _ in self.workers:
+                    await self.queue.put(None)
+                await asyncio.gather(*self.workers)
+            else:
+                for w in self.workers:
+                    w.cancel()
+                await asyncio.gather(*self.workers, return_exceptions=True)
+        finally:
+            await self._stack.__aexit__(exc_type, exc, tb)
+
+        c = self.counts
+        if c["img"] + c["vid"] == 0:
+            logger.debug("所有符合条件的文件均已存在或被跳过")
+            return
+        self.downloader._log_summary(c["img"], c["vid"], c["img_ok"], c["vid_ok"])
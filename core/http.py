@@ -0,0 +1,69 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolConfig:
+    """连接池参数"""
+    limit: int = 100              # 总连接数上限
+    limit_per_host: int = 16      # 单个 host 的连接数上限
+    keepalive_timeout: float = 30 # 空闲连接保活时间（秒）
+    dns_cache_ttl: int = 300      # DNS 缓存时间（秒）
+
+
+class HttpClient:
+    """
+    全程共用的 HTTP 客户端：计数、翻页、下载复用同一个连接池，
+    避免每个阶段重新做 DNS 解析、TCP 与 TLS 握手
+    需在事件循环内通过 async with 或 start() 启动
+    """
+
+    def __init__(self, proxy=None, pool: PoolConfig = None):
+        self.proxy = proxy if isinstance(proxy, str) and proxy else None
+        self.pool = pool or PoolConfig()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> "HttpClient":
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool.limit,
+                limit_per_host=self.pool.limit_per_host,
+                keepalive_timeout=self.pool.keepalive_timeout,
+                ttl_dns_cache=self.pool.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+            logger.debug(f"HTTP连接池已创建: 总数 {self.pool.limit}，单host {self.pool.limit_per_host}")
+        return self
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def get(self, url, **kwargs):
+        """发起GET请求（自动带上代理），用法同 aiohttp 的 session.get"""
+        kwargs.setdefault("proxy", self.proxy)
+        return self.session.get(url, **kwargs)
+
+
+@asynccontextmanager
+async def client_scope(client: Optional[HttpClient], proxy=None):
+    """有共享客户端时直接使用；没有时临时创建一个，用完关闭"""
+    if client is not None:
+        await client.start()
+        yield client
+        return
+    async with HttpClient(proxy=proxy) as temp:
+        yield temp
@@ -0,0 +1,164 @@
+import json
+import os
+import zlib
+from typing import Iterable
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 键 = 站点名crc32低16位 << 48 | 作品id，不同站点的同号作品互不冲突
+_ID_BITS = 48
+_site_codes: dict[str, int] = {}
+
+
+def make_keys(sites: Iterable, post_ids: Iterable) -> np.ndarray:
+    """(site, id) -> uint64 键数组"""
+    codes = []
+    for site in sites:
+        site = str(site)
+        code = _site_codes.get(site)
+        if code is None:
+            code = _site_codes[site] = zlib.crc32(site.encode("utf-8")) & 0xFFFF
+        codes.append(code)
+    codes = np.asarray(codes, dtype=np.uint64)
+    ids = np.asarray(list(post_ids), dtype=np.uint64)
+    return (codes << np.uint64(_ID_BITS)) | ids
+
+
+class IdIndex:
+    """
+    数据文件旁的持久化 (site, id) 索引，用于去重时不再重读整个CSV（子类可改为其他数据源）
+    - <csv>.idx.npy：有序键数组，内存映射读取，二分查找
+    - <csv>.idx.tail：之后追加的键（未排序），积累到一定数量后合并进有序数组
+    - <csv>.idx.json：记录索引对应的数据源大小与修改时间，被其他工具改写过时自动重建
+    """
+
+    # 追加区超过 max(该值, 有序区的1/8) 时合并
+    COMPACT_MIN = 65536
+
+    def __init__(self, source_path: str, index_path: str = None):
+        self.source_path = source_path
+        index_path = index_path or source_path
+        self.main_path = index_path + ".idx.npy"
+        self.tail_path = index_path + ".idx.tail"
+        self.meta_path = index_path + ".idx.json"
+        self._main = np.empty(0, dtype=np.uint64)
+        self._tail = np.empty(0, dtype=np.uint64)
+        self._open()
+
+    def __len__(self):
+        return len(self._main) + len(self._tail)
+
+    def _source_stat(self):
+        """数据源的状态（大小、修改时间），与记录不一致说明被外部改写过"""
+        if not os.path.exists(self.source_path):
+            return None
+        stat = os.stat(self.source_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _open(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        source_stat = self._source_stat()
+        if source_stat is None:
+            logger.debug(f"文件不存在，使用空索引: {self.source_path}")
+            self._remove_files()
+            return
+
+        if meta is None or meta.get("source") != source_stat:
+            self.rebuild()
+            return
+
+        if os.path.exists(self.main_path):
+            self._main = self._load_main()
+        if os.path.exists(self.tail_path):
+            self._tail = np.fromfile(self.tail_path, dtype=np.uint64)
+        logger.debug(f"加载ID索引 {len(self)} 条: {self.main_path}")
+
+    def _remove_files(self):
+        """删除残留的索引文件（数据源已删除时，旧的键不能再与新写入的键混在一起）"""
+        for path in (self.main_path, self.tail_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+                logger.debug(f"删除过期的ID索引文件: {path}")
+
+    def _load_main(self) -> np.ndarray:
+        try:
+            return np.load(self.main_path, mmap_mode="r")
+        except ValueError:
+            # 空数组无法内存映射
+            return np.load(self.main_path)
+
+    def _write_main(self, keys: np.ndarray):
+        """原子替换有序数组文件（先释放旧的内存映射，Windows下被映射的文件无法替换）"""
+        self._main = None
+        tmp_path = self.main_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, keys)
+        os.replace(tmp_path, self.main_path)
+        self._main = self._load_main()
+
+        self._tail = np.empty(0, dtype=np.uint64)
+        open(self.tail_path, "wb").close()
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self._source_stat()}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _iter_source(self):
+        """按块读取数据源的 Id/Site 列"""
+        return pd.read_csv(self.source_path, usecols=lambda c: c in ("Id", "Site"), dtype=str, chunksize=200000)
+
+    def rebuild(self):
+        """从数据源的 Id/Site 列重建索引（只在索引缺失或数据源被外部改写时执行）"""
+        logger.info(f"重建ID索引: {self.source_path}")
+        parts = []
+        try:
+            for chunk in self._iter_source():
+                post_ids = pd.to_numeric(chunk["Id"], errors="coerce")
+                valid = post_ids.notna()
+                sites = chunk["Site"][valid] if "Site" in chunk else [""] * int(valid.sum())
+                parts.append(make_keys(sites, post_ids[valid].astype(np.int64)))
+        except Exception as e:
+            logger.debug(f"读取ID列出错（文件可能为空）: {e}")
+
+        keys = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.uint64)
+        self._write_main(keys)
+        self._write_meta()
+        logger.debug(f"ID索引重建完成，共 {len(keys)} 条")
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """批量判断键是否已存在，返回布尔数组"""
+        found = np.zeros(len(keys), dtype=bool)
+        if len(self._main):
+            pos = np.searchsorted(self._main, keys)
+            in_range = pos < len(self._main)
+            found[in_range] = self._main[pos[in_range]] == keys[in_range]
+        if len(self._tail):
+            found |= np.isin(keys, self._tail)
+        return found
+
+    def filter_new(self, keys: np.ndarray) -> np.ndarray:
+        """返回未收录且批次内首次出现的键的下标"""
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        return first[~self.contains(keys[first])]
+
+    def add(self, keys: np.ndarray):
+        """数据写入成功后登记新键，并记录数据源当前状态"""
+        if len(keys):
+            keys = np.asarray(keys, dtype=np.uint64)
+            with open(self.tail_path, "ab") as f:
+                keys.tofile(f)
+            self._tail = np.concatenate([self._tail, keys])
+            if len(self._tail) > max(self.COMPACT_MIN, len(self._main) // 8):
+                self._write_main(np.union1d(self._main, self._tail))
+        self._write_meta()
@@ -1,6 +1,7 @@
 import logging
 from rich.logging import RichHandler
 from rich.console import Console
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, MofNCompleteColumn
 # from tqdm import tqdm
 
 # class TqdmLoggingHandler(logging.Handler):
@@ -15,6 +16,23 @@ from rich.console import Console
     
 console = Console()
 
+def create_progress() -> Progress:
+    """
+    统一样式的进度条，任务颜色由 add_task(..., style="cyan") 指定
+    同一时间只能有一个进度条显示，边抓边下时抓取与下载共用同一个实例
+    """
+    return Progress(
+        TextColumn("        "),
+        SpinnerColumn(),
+        TextColumn("[{task.fields[style]}]{task.description:<20}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TaskProgressColumn(),
+        TimeRemainingColumn(),
+        console=console,
+        transient=False
+    )
+
 def setup_global_logger(level: str="INFO"):
     """初始化全局日志配置"""
     level_mapping = {
@@ -1,13 +1,51 @@
+from array import array
 from dataclasses import dataclass, field
+from enum import Enum
 import os
-from typing import Optional
+import sys
+from typing import Optional, Union
+from core.vocab import TAG_VOCAB
 
-@dataclass
+
+class _StrEnum(str, Enum):
+    """可直接当作字符串使用的枚举（比较、写CSV、存数据库时都等同于其值）"""
+    def __str__(self):
+        return self.value
+
+    def __format__(self, spec):
+        return self.value.__format__(spec)
+
+
+class Site(_StrEnum):
+    GELBOORU = "Gelbooru"
+    DANBOORU = "Danbooru"
+
+
+class Rating(_StrEnum):
+    GENERAL = "general"
+    SENSITIVE = "sensitive"
+    QUESTIONABLE = "questionable"
+    EXPLICIT = "explicit"
+
+
+_SITES = {s.value: s for s in Site}
+_RATINGS = {r.value: r for r in Rating}
+VIDEO_EXTENSIONS = frozenset(['.mp4', '.webm', '.gif'])
+
+
+def _intern(value, table) -> Union[str, Enum]:
+    """已知取值转为共享的枚举成员，未知取值做字符串驻留，避免每个实例各存一份"""
+    if isinstance(value, Enum) or not value:
+        return value if value is not None else ""
+    return table.get(value) or sys.intern(str(value))
+
+
+@dataclass(slots=True)
 class ImageItem:
     id: int
     url: str
     rating: str
-    tags: str
+    tags: Optional[str]
     width: int
     height: int
     source: str = ""
@@ -15,24 +53,30 @@ class ImageItem:
     score: int = 0
     site: str = ""
     artist: str = ""
-    
+    # 字典编码后的标签id（调用 compact_tags 后 tags 字符串会被释放）
+    tag_ids: Optional[array] = field(default=None, repr=False)
+
     _extension: Optional[str] = field(default=None, repr=False)
 
+    def __post_init__(self):
+        self.site = _intern(self.site, _SITES)
+        self.rating = _intern(self.rating, _RATINGS)
+
     @property
     def extension(self) -> str:
-        """从URL自动获取文件后缀，如果获取失败则默认为.jpg"""
+        """从URL自动获取文件后缀，如果获取失败则默认为.jpg（结果缓存）"""
         if self._extension:
             return self._extension
-        
+
+        ext = ""
         if self.url:
             ext = os.path.splitext(self.url)[-1]
             # URL参数清洗：.jpg?v=123 -> .jpg
             if '?' in ext:
                 ext = ext.split('?')[0]
-            if ext:
-                return ext.lower()
-        
-        return ".jpg"
+
+        self._extension = sys.intern(ext.lower()) if ext else ".jpg"
+        return self._extension
 
     @property
     def filename(self) -> str:
@@ -42,27 +86,49 @@ class ImageItem:
     @property
     def is_video(self) -> bool:
         """判断是否为视频文件"""
-        return self.extension in ['.mp4', '.webm', '.gif']
+        return self.extension in VIDEO_EXTENSIONS
 
     @property
     def is_explicit(self) -> bool:
         """判断是否为R18内容"""
         return self.rating.lower() in ['explicit', 'e', 'sx']
 
+    @property
+    def tag_string(self) -> str:
+        """空格分隔的标签字符串（已压缩时从标签字典还原）"""
+        if self.tags is not None:
+            return self.tags
+        if self.tag_ids is not None:
+            return " ".join(TAG_VOCAB.decode(self.tag_ids))
+        return ""
+
+    def encode_tags(self) -> array:
+        """按进程内共用的标签字典把标签编码为id数组（只编码一次，之后直接复用）"""
+        if self.tag_ids is None:
+            self.tag_ids = TAG_VOCAB.encode(self.tags)
+        return self.tag_ids
+
+    def compact_tags(self) -> "ImageItem":
+        """编码标签并释放原字符串，百万级条目时节省内存"""
+        if self.tags is not None:
+            self.encode_tags()
+            self.tags = None
+        return self
+
     def to_dict(self, artist="") -> dict:
         """导出为字典用于CSV保存"""
         final_artist = self.artist or artist or "Unknown"
-        
+
         row = {
             "Id": self.id,
-            "Site": self.site,
+            "Site": str(self.site),
             "Posted": self.created_at,
             "Artist": final_artist,
-            "Rating": self.rating,
+            "Rating": str(self.rating),
             "Score": self.score,
             "Size": f"{self.width}x{self.height}",
             "File_URL": self.url,
-            "Tags": self.tags
+            "Tags": self.tag_string
         }
-        
-        return row
\ No newline at end of file
+
+        return row
@@ -0,0 +1,68 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from core.models import ImageItem
+from core.sinks import Sink
+from core.log_config import create_progress
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineStats:
+    """流式抓取的汇总结果（不保留条目本身）"""
+    total: int = 0
+    pages: int = 0
+    max_id: Optional[int] = None
+    complete: bool = True
+
+
+async def run_pipeline(crawler, tags: str, limit_num: int, sinks: List[Sink],
+                       since_id: Optional[int] = None,
+                       transform: Optional[Callable[[List[ImageItem]], List[ImageItem]]] = None,
+                       queue_size: int = 8) -> PipelineStats:
+    """
+    边抓取边处理：每页数据经 transform 后依次交给各个 sink，下载与抓取在同一事件循环中并行
+    sink 处理慢时通过有界队列反压抓取，内存占用不随抓取总量增长
+    """
+    stats = PipelineStats()
+
+    async def dispatch(page_items):
+        if transform:
+            # transform 可能查询数据库（如画师名单），与各 sink 一样放到线程中执行
+            page_items = await asyncio.to_thread(transform, page_items)
+        for sink in sinks:
+            await sink.write(page_items)
+        stats.total += len(page_items)
+        stats.pages += 1
+        page_max = max(int(item.id) for item in page_items)
+        if stats.max_id is None or page_max > stats.max_id:
+            stats.max_id = page_max
+
+    # 抓取与下载共用一个进度条（rich 同一时间只能显示一个）
+    with create_progress() as progress:
+        for sink in sinks:
+            await sink.open(progress)
+        error = None
+        try:
+            async for page_items in crawler.iter_pages(tags, limit_num, since_id=since_id, queue_size=queue_size, progress=progress):
+                await dispatch(page_items)
+
+            if crawler.failed_pages:
+                failed = list(crawler.failed_pages)
+                logger.info(f"补抓 {len(failed)} 个失败页: {failed}")
+                async for page_items in crawler.iter_pages(tags, crawler.last_limit, pages=failed, queue_size=queue_size, progress=progress):
+                    await dispatch(page_items)
+
+            stats.complete = crawler.crawl_complete
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            for sink in sinks:
+                await sink.close(error)
+
+    logger.debug(f"流式处理完成: {stats.pages} 页，{stats.total} 条")
+    return stats
+
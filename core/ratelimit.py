@@ -0,0 +1,89 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 各站点默认限速：host -> (每秒请求数, 突发容量)
+# "*.example.com" 匹配所有子域名，同一规则下的所有 host 共用一个令牌桶
+DEFAULT_RATE_LIMITS = {
+    "danbooru.donmai.us": (10, 10),  # Danbooru 文档：读请求 10 次/秒
+    "cdn.donmai.us": (20, 20),
+    "gelbooru.com": (5, 5),
+    "*.gelbooru.com": (20, 20),      # img*.gelbooru.com 等图片CDN
+}
+DEFAULT_RATE = (10, 10)
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate 匀速补充令牌，最多积攒 burst 个
+    采用"预约"方式扣减令牌（允许暂时为负），不依赖锁，可跨事件循环共用
+    """
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate 必须 > 0，burst 必须 >= 1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _reserve(self, n: float = 1) -> float:
+        """扣减令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    async def acquire(self, n: float = 1) -> None:
+        wait = self._reserve(n)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """按 host 分桶的限速器，爬虫与下载器的所有请求都经过这里"""
+
+    def __init__(self, limits: dict = None, default=DEFAULT_RATE):
+        self.configure(limits, default)
+
+    def configure(self, limits: dict = None, default=None) -> None:
+        """更新限速规则（已有的令牌桶会被重建）"""
+        self.limits = dict(DEFAULT_RATE_LIMITS if limits is None else limits)
+        if default is not None:
+            self.default = tuple(default)
+        self.buckets: dict[str, TokenBucket] = {}
+
+    def _rule_key(self, host: str) -> str:
+        if host in self.limits:
+            return host
+        parts = host.split(".")
+        for i in range(1, len(parts) - 1):
+            pattern = "*." + ".".join(parts[i:])
+            if pattern in self.limits:
+                return pattern
+        return host
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        host = (urlsplit(url).hostname or "").lower()
+        key = self._rule_key(host)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits.get(key, self.default)
+            bucket = TokenBucket(rate, burst)
+            self.buckets[key] = bucket
+            logger.debug(f"限速规则 {key}: {rate} 次/秒，突发 {burst}")
+        return bucket
+
+    async def acquire(self, url: str) -> None:
+        """等待目标 host 的令牌"""
+        await self.bucket_for(url).acquire()
+
+
+# 进程内共享的限速器：同一 host 的多次抓取、抓取与下载之间共用额度
+shared_limiter = RateLimiter()
@@ -0,0 +1,127 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPStatusError(Exception):
+    """非200响应，携带状态码与服务器给出的 Retry-After（秒）"""
+    def __init__(self, status: int, retry_after: float = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RetryBudgetExhausted(Exception):
+    """本次抓取的重试预算已用完"""
+
+
+def parse_retry_after(value) -> float:
+    """解析 Retry-After 头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class StatusRule:
+    """单个状态码的重试规则"""
+    max_attempts: int
+    base_delay: float
+    respect_retry_after: bool = True
+
+
+DEFAULT_STATUS_RULES = {
+    429: StatusRule(max_attempts=6, base_delay=2.0),
+    500: StatusRule(max_attempts=3, base_delay=1.0),
+    502: StatusRule(max_attempts=4, base_delay=1.0),
+    503: StatusRule(max_attempts=5, base_delay=2.0),
+    504: StatusRule(max_attempts=4, base_delay=1.0),
+}
+
+
+@dataclass
+class RetryPolicy:
+    """重试策略：未列出的状态码不重试，超时/连接错误按默认规则重试"""
+    max_attempts: int = 4        # 超时/连接错误的最大尝试次数
+    base_delay: float = 1.0      # 指数退避的基础延迟（秒）
+    max_delay: float = 60.0      # 单次等待上限（秒）
+    budget: int = 200            # 每次抓取/下载任务允许的重试总次数
+    status_rules: dict = field(default_factory=lambda: dict(DEFAULT_STATUS_RULES))
+
+    def rule_for(self, error) -> StatusRule:
+        """返回该错误对应的重试规则，不可重试时返回None"""
+        if isinstance(error, HTTPStatusError):
+            return self.status_rules.get(error.status)
+        if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+            return StatusRule(self.max_attempts, self.base_delay)
+        return None
+
+
+class RetryBudget:
+    """跨请求共享的重试次数预算，防止大面积故障时无限重试"""
+    def __init__(self, total: int):
+        self.total = total
+        self.used = 0
+
+    def try_spend(self) -> bool:
+        if self.used >= self.total:
+            return False
+        self.used += 1
+        return True
+
+
+class RetryEngine:
+    """带抖动指数退避、Retry-After 支持和重试预算的重试执行器"""
+
+    def __init__(self, policy: RetryPolicy = None):
+        self.policy = policy or RetryPolicy()
+        self.budget = RetryBudget(self.policy.budget)
+
+    def compute_delay(self, rule: StatusRule, attempt: int, retry_after: float = None) -> float:
+        """full jitter 指数退避；服务器给出 Retry-After 时至少等待该时长"""
+        cap = min(self.policy.max_delay, rule.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, cap)
+        if rule.respect_retry_after and retry_after is not None:
+            delay = max(delay, min(retry_after, self.policy.max_delay))
+        return delay
+
+    async def call(self, attempt_fn, label: str = ""):
+        """
+        反复调用 attempt_fn() 直到成功
+        attempt_fn 需在失败时抛出 HTTPStatusError / 超时 / 连接异常；
+        不可重试、次数用尽或预算耗尽时抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await attempt_fn()
+            except Exception as e:
+                rule = self.policy.rule_for(e)
+                if rule is None or attempt >= rule.max_attempts:
+                    raise
+                if not self.budget.try_spend():
+                    logger.warning(f"{label} 重试预算已耗尽 ({self.budget.total} 次)，放弃重试")
+                    raise RetryBudgetExhausted(str(e)) from e
+
+                retry_after = getattr(e, "retry_after", None)
+                delay = self.compute_delay(rule, attempt, retry_after)
+                logger.debug(f"{label} 第 {attempt} 次失败({e!r})，{delay:.1f}s 后重试")
+                await asyncio.sleep(delay)
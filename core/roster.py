@@ -1,14 +1,37 @@
 import os
-from .models import ImageItem
-from typing import List
+from .models import ImageItem, Site
+from .vocab import TAG_VOCAB
+from collections import Counter
+from typing import Iterable, List
+import numpy as np
+import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 安装了 pyarrow 时用其向量化字符串函数拆分标签，否则逐行匹配（清洗 Parquet 数据集则必须安装）
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("使用 Parquet 数据集需要安装 pyarrow: pip install pyarrow")
+
+
 class ArtistRoster:
+    # 清洗CSV时每次读取的行数（控制内存占用）
+    CHUNK_SIZE = 100000
+
     def __init__(self, filepath):
         self.filepath = filepath
         self.artists = set()
+        # 批量匹配用的名单数组（首次匹配时生成，名单变化后重建）
+        self._artist_index = None
         self._load()
 
     def _load(self):
@@ -24,6 +47,7 @@ class ArtistRoster:
         artist_name = artist_name.strip().lower()
         if artist_name and artist_name not in self.artists:
             self.artists.add(artist_name)
+            self._artist_index = None
             
             os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
             
@@ -35,85 +59,258 @@ class ArtistRoster:
         else:
             logger.debug(f"画师已存在，忽略: {artist_name}")
 
-    def extract_artists(self, tags_str):
-        """从标签中匹配已知画师"""
-        if not tags_str:
-            return []
-        
-        tags_set = set(tags_str.lower().split())
-        matched = tags_set.intersection(self.artists)
-        
-        if matched:
-            logger.debug(f"标签匹配到画师: {matched}")
-        
-        return list(matched)
-    
+    def _explode_hits(self, tags: pd.Series):
+        """整列拆分展开后与名单做一次 is_in 比对，返回命中标签所在的行位置与标签名"""
+        if pa is not None:
+            lists = pc.utf8_split_whitespace(pc.utf8_lower(pa.array(tags, type=pa.string())))
+            flat = pc.list_flatten(lists)
+            hit = pc.is_in(flat, value_set=self._artist_index).to_numpy(zero_copy_only=False)
+            positions = pc.list_parent_indices(lists).to_numpy()[hit]
+            return positions, flat.filter(hit).to_pylist()
+
+        # 没有 pyarrow 时 pandas 的 explode 反而比逐行查集合慢
+        artists = self.artists
+        hits = [(position, name) for position, text in enumerate(tags) for name in text.lower().split() if name in artists]
+        return np.array([h[0] for h in hits], dtype=np.int64), [h[1] for h in hits]
+
+    def match_tags(self, tags: pd.Series) -> pd.Series:
+        """
+        批量匹配画师：整列只拆分一次，与名单比对后再按行聚合
+        返回匹配到画师的行（索引与输入一致，值为 ", " 连接的画师名，按标签顺序去重）
+        """
+        tags = tags.dropna()
+        if tags.empty or not self.artists:
+            return pd.Series(dtype=object)
+
+        if pa is not None and self._artist_index is None:
+            self._artist_index = pa.array(sorted(self.artists), type=pa.string())
+
+        positions, names = self._explode_hits(tags.astype(str))
+        # 命中的行通常很少，直接用字典聚合
+        matched = {}
+        for position, name in zip(positions.tolist(), names):
+            matched.setdefault(position, {})[name] = None
+
+        index = tags.index[list(matched)]
+        return pd.Series([", ".join(found) for found in matched.values()], index=index, dtype=object)
+
+    def _lookup_artist_ids(self, tag_ids: np.ndarray) -> dict:
+        """批次中出现的画师标签：标签id -> 画师名（按标签名比对，标签写库后id会从临时id换成数据库id）"""
+        unique = np.unique(tag_ids).tolist()
+        artists = self.artists
+        return {tag_id: name for tag_id, name in zip(unique, TAG_VOCAB.decode(unique)) if name in artists}
+
     def assign_artists(self, image_items: List[ImageItem]) -> List[ImageItem]:
-        """为缺失画师属性的图片分配画师"""
+        """为缺失画师属性的图片分配画师（整批标签id拼成一个数组，一次 isin 比对）"""
         if not image_items:
             return []
 
-        matched_count = 0
-        for item in image_items:
-            if item.artist == "Unknown":
-                matched_artists = self.extract_artists(item.tags)
-                if matched_artists:
-                    item.artist = ", ".join(matched_artists)
-                    matched_count += 1
-                    logger.debug(f"[{item.id}] 匹配到画师: {item.artist}")
-                    
-        if matched_count > 0:
-            logger.debug(f"共匹配 {matched_count} 张图片的画师")
-                    
+        # Gelbooru 作品不带画师字段（为空），与 Unknown 同样处理
+        unknown = [item for item in image_items if item.artist in ("", "Unknown")]
+        if not unknown:
+            return image_items
+
+        tag_ids = [np.frombuffer(item.encode_tags(), dtype=np.uint32) for item in unknown]
+        lengths = np.fromiter(map(len, tag_ids), dtype=np.int64, count=len(tag_ids))
+        flat = np.concatenate(tag_ids)
+        artist_ids = self._lookup_artist_ids(flat)
+        hit = np.isin(flat, np.fromiter(artist_ids, dtype=np.uint32, count=len(artist_ids)))
+
+        matched: dict = {}
+        owners = np.repeat(np.arange(len(unknown)), lengths)
+        for owner, tag_id in zip(owners[hit].tolist(), flat[hit].tolist()):
+            matched.setdefault(owner, {})[artist_ids[tag_id]] = None
+
+        for owner, names in matched.items():
+            item = unknown[owner]
+            item.artist = ", ".join(names)
+            logger.debug(f"[{item.id}] 匹配到画师: {item.artist}")
+
+        if matched:
+            logger.debug(f"共匹配 {len(matched)} 张图片的画师")
+
         return image_items
-    
+
     def clean_summary_dataset(self, csv_path: str) -> None:
-        """扫描数据集，为Unknown数据重新匹配画师"""
-        import pandas as pd
-        
+        """
+        扫描数据集，为Unknown数据重新匹配画师
+        分块读取：第一遍只读 Artist/Tags 两列找出可更新的行，有更新时第二遍分块改写到临时文件再替换，内存占用与文件大小无关
+        """
         if not os.path.exists(csv_path):
             logger.warning(f"数据集文件不存在: {csv_path}")
             return
 
         logger.info(f"开始清洗数据集: {csv_path}")
+        # 全部按字符串读取，改写时原样保留其他列的内容
+        read_options = dict(dtype=str, keep_default_na=False, chunksize=self.CHUNK_SIZE)
+        updates = []
+        total = unknown = 0
         try:
-            df = pd.read_csv(csv_path)
+            for chunk in pd.read_csv(csv_path, usecols=lambda c: c in ('Artist', 'Tags'), **read_options):
+                if 'Artist' not in chunk.columns or 'Tags' not in chunk.columns:
+                    logger.warning("数据集缺少必要列：Artist 或 Tags")
+                    return
+                total += len(chunk)
+                # 定位画师为Unknown且Tags不为空的行
+                mask = (chunk['Artist'] == 'Unknown') & (chunk['Tags'] != "")
+                unknown += int(mask.sum())
+                if mask.any():
+                    updates.append(self.match_tags(chunk.loc[mask, 'Tags']))
         except Exception as e:
             logger.error(f"读取CSV失败: {e}")
             return
 
-        if 'Artist' not in df.columns or 'Tags' not in df.columns:
-            logger.warning("数据集缺少必要列：Artist 或 Tags")
+        logger.debug(f"扫描数据集，共 {total} 条记录，其中Unknown {unknown} 条")
+        if not unknown:
+            logger.info("没有需要清洗的Unknown数据")
             return
 
-        updated_count = 0
-        logger.debug(f"扫描数据集，共 {len(df)} 条记录")
+        updates = pd.concat(updates) if updates else pd.Series(dtype=object)
+        updated_count = len(updates)
+        if not updated_count:
+            logger.info("无新画师可匹配")
+            return
 
-        # 定位画师为Unknown且Tags不为空的行
-        mask = (df['Artist'] == 'Unknown') & df['Tags'].notna()
-        
-        if not mask.any():
-            logger.info("没有需要清洗的Unknown数据")
+        logger.info(f"成功匹配 {updated_count} 条未知数据的画师")
+        tmp_path = csv_path + ".tmp"
+        try:
+            # 分块读取时行索引连续递增，与第一遍的行号一致
+            for i, chunk in enumerate(pd.read_csv(csv_path, **read_options)):
+                hits = updates[(updates.index >= chunk.index[0]) & (updates.index <= chunk.index[-1])]
+                if not hits.empty:
+                    chunk.loc[hits.index, 'Artist'] = hits
+                chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False,
+                             encoding='utf-8-sig' if i == 0 else 'utf-8')
+            os.replace(tmp_path, csv_path)
+            logger.info(f"数据已保存: {csv_path}")
+        except Exception as e:
+            logger.error(f"保存CSV失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clean_parquet_dataset(self, dataset) -> None:
+        """扫描 Parquet 数据集，为Unknown数据重新匹配画师（只读取 Artist/Tags 两列，仅改写有变化的文件）"""
+        _require_pyarrow()
+        files = dataset.files()
+        if not files:
+            logger.warning(f"数据集为空: {dataset.root}")
             return
-        
-        logger.debug(f"发现 {mask.sum()} 条Unknown记录待处理")
-        
-        # 批量提取并匹配画师
-        def fast_match(tags_str):
-            matched = self.extract_artists(str(tags_str))
-            return ", ".join(matched) if matched else "Unknown"
-            
-        new_artists_series = df.loc[mask, 'Tags'].apply(fast_match)
-        success_updates = new_artists_series[new_artists_series != "Unknown"]
-        updated_count = len(success_updates)
-        
+
+        logger.info(f"开始清洗数据集: {dataset.root}")
+        updated_count = 0
+        for path in files:
+            df = pq.read_table(path, columns=['Artist', 'Tags']).to_pandas()
+            mask = (df['Artist'] == 'Unknown') & df['Tags'].notna()
+            if not mask.any():
+                continue
+
+            matched = self.match_tags(df.loc[mask, 'Tags'])
+            if matched.empty:
+                continue
+
+            df.loc[matched.index, 'Artist'] = matched
+            table = pq.read_table(path)
+            column = table.schema.get_field_index('Artist')
+            table = table.set_column(column, 'Artist', pa.array(df['Artist'], type=pa.string()))
+            tmp_path = path + ".tmp"
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+            updated_count += len(matched)
+
         if updated_count > 0:
-            df.loc[success_updates.index, 'Artist'] = success_updates
             logger.info(f"成功匹配 {updated_count} 条未知数据的画师")
-            try:
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                logger.info(f"数据已保存: {csv_path}")
-            except Exception as e:
-                logger.error(f"保存CSV失败: {e}")
         else:
-            logger.info("无新画师可匹配")
\ No newline at end of file
+            logger.info("无新画师可匹配")
+
+
+class DBArtistRoster(ArtistRoster):
+    """
+    保存在项目数据库（artist_roster 表）中的画师名单，接口与 ArtistRoster 相同
+    - 抓取时按页批量查询出现的标签是否为画师，不在启动时载入整个名单
+    - Danbooru 作品自带画师标签（tag_string_artist），抓取时自动批量记入名单
+    - 可导出为原来的 artists_roster.txt，供按txt读取名单的工具使用
+    """
+
+    def __init__(self, db, filepath: str = None):
+        self.db = db
+        # 名单有变化时才需要重新导出txt
+        self.changed = False
+        super().__init__(filepath)
+
+    @property
+    def artists(self) -> set:
+        """完整名单（整表清洗时才需要，首次访问时从数据库载入）"""
+        if self._artists is None:
+            self._artists = self.db.roster_names()
+        return self._artists
+
+    @artists.setter
+    def artists(self, value):
+        self._artists = value or None
+
+    def _load(self):
+        """把txt名单合并进数据库（已有的名称保持不变，可重复执行），手动加入txt的画师也会被收录"""
+        if not self.filepath or not os.path.exists(self.filepath):
+            return
+        super()._load()
+        # 读出的只是txt中的部分名单，完整名单仍按需从数据库载入
+        names, self.artists = self._artists or set(), None
+        added = self.add_many(dict.fromkeys(names, 0), source="txt")
+        if added:
+            logger.info(f"从txt名单导入 {len(added)} 位画师到数据库 ({self.filepath})")
+
+    def add_many(self, counts: dict, source: str) -> List[str]:
+        """批量登记画师（名称 -> 作品数），返回新增的名称"""
+        counts = {name.strip().lower(): count for name, count in counts.items() if name.strip()}
+        added = self.db.add_to_roster(counts, source)
+        if added:
+            self.changed = True
+            self._artist_index = None
+            if self._artists is not None:
+                self._artists.update(added)
+        return added
+
+    def add(self, artist_name):
+        """新增画师到名单"""
+        if self.add_many({artist_name: 0}, source="manual"):
+            logger.info(f"新增画师: {artist_name.strip().lower()}")
+        else:
+            logger.debug(f"画师已存在，忽略: {artist_name}")
+
+    def learn(self, image_items: Iterable[ImageItem]) -> List[str]:
+        """把 Danbooru 作品的画师标签批量记入名单，返回新增的名称（作品数只计尚未入库的作品，重复抓取不会累加）"""
+        items = [item for item in image_items if item.site == Site.DANBOORU and item.artist and item.artist != "Unknown"]
+        if not items:
+            return []
+        stored = self.db.stored_post_ids(str(Site.DANBOORU), [item.id for item in items])
+        counts = Counter()
+        for item in items:
+            for name in item.artist.split(","):
+                counts[name.strip()] += item.id not in stored
+        added = self.add_many(counts, source="danbooru")
+        if added:
+            logger.debug(f"从画师标签学习到 {len(added)} 位新画师: {added[:10]}")
+        return added
+
+    def _lookup_artist_ids(self, tag_ids: np.ndarray) -> dict:
+        """只查询本批次出现过的标签"""
+        unique = np.unique(tag_ids).tolist()
+        candidates = dict(zip(TAG_VOCAB.decode(unique), unique))
+        return {candidates[name]: name for name in self.db.roster_contains(candidates)}
+
+    def assign_artists(self, image_items: List[ImageItem]) -> List[ImageItem]:
+        """先学习本页 Danbooru 作品的画师，再为缺失画师的作品匹配"""
+        self.learn(image_items)
+        return super().assign_artists(image_items)
+
+    def export_txt(self, path: str = None) -> str:
+        """导出为一行一个画师名的txt（与 artists_roster.txt 格式相同）"""
+        path = path or self.filepath
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{name}\n" for name in sorted(self.db.roster_names()))
+        os.replace(tmp_path, path)
+        self.changed = False
+        logger.info(f"画师名单已导出: {path}")
+        return path
@@ -0,0 +1,308 @@
+import re
+import zlib
+from itertools import chain
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.database import DBManager
+from core.vocab import TAG_VOCAB
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATING_ALIASES = {"g": "general", "s": "sensitive", "q": "questionable", "e": "explicit"}
+ORDERS = {
+    "id": ("id", False), "id_asc": ("id", False), "id_desc": ("id", True),
+    "score": ("score", True), "score_desc": ("score", True), "score_asc": ("score", False),
+}
+_META_RE = re.compile(r"^(rating|score|width|height|site|artist|order):(.+)$")
+_RANGE_RE = re.compile(r"^(>=|<=|>|<)?(-?\d+)(?:\.\.(-?\d+))?$")
+
+
+def encode_postings(image_ids: np.ndarray) -> bytes:
+    """有序图片id -> 差分 + zlib 压缩"""
+    deltas = np.diff(image_ids, prepend=0).astype(np.uint32)
+    return zlib.compress(deltas.tobytes(), 1)
+
+
+def decode_postings(data: bytes) -> np.ndarray:
+    deltas = np.frombuffer(zlib.decompress(data), dtype=np.uint32)
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+@dataclass
+class TagQuery:
+    """解析后的检索条件"""
+    include: List[str] = field(default_factory=list)      # 必须包含的标签
+    exclude: List[str] = field(default_factory=list)      # 必须不含的标签（-tag）
+    any_of: List[str] = field(default_factory=list)       # 至少包含其一（~tag）
+    ranges: List[Tuple[str, Optional[int], Optional[int], bool]] = field(default_factory=list)  # (列, 下限, 上限, 取反)
+    values: List[Tuple[str, List[str], bool]] = field(default_factory=list)  # (rating/site/artist, 取值, 取反)
+    order: str = "id_desc"
+
+
+def _parse_range(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """>50 / >=50 / <10 / 50 / 10..20 -> 闭区间 (下限, 上限)"""
+    match = _RANGE_RE.match(text)
+    if not match:
+        raise ValueError(f"无效的数值条件: {text!r}")
+    op, low, high = match.groups()
+    low = int(low)
+    if high is not None:
+        return low, int(high)
+    return {
+        ">": (low + 1, None), ">=": (low, None),
+        "<": (None, low - 1), "<=": (None, low),
+        None: (low, low),
+    }[op]
+
+
+def parse_query(query: str) -> TagQuery:
+    """解析 booru 风格检索式，例如 'tag1 tag2 -tag3 ~a ~b rating:general score:>50 order:score'"""
+    parsed = TagQuery()
+    for token in query.lower().split():
+        negate = token.startswith("-")
+        if negate:
+            token = token[1:]
+        match = _META_RE.match(token)
+        if match:
+            key, value = match.groups()
+            if key == "order":
+                if value not in ORDERS:
+                    raise ValueError(f"无效的排序: {value!r}，可选: {', '.join(ORDERS)}")
+                parsed.order = value
+            elif key in ("score", "width", "height"):
+                parsed.ranges.append((key, *_parse_range(value), negate))
+            else:
+                items = value.split(",")
+                if key == "rating":
+                    items = [RATING_ALIASES.get(v, v) for v in items]
+                parsed.values.append((key, items, negate))
+        elif token.startswith("~"):
+            parsed.any_of.append(token[1:])
+        elif negate:
+            parsed.exclude.append(token)
+        elif token:
+            parsed.include.append(token)
+    return parsed
+
+
+class TagSearch:
+    """
+    本地数据库的标签检索：标签条件走压缩倒排索引（tag_postings 表），
+    评级/分数/尺寸/站点等条件在内存中的列数组上过滤
+    倒排索引按图片id增量更新：每次创建时只为新入库的图片补建，并修补 save_rows 记录的已有图片的标签变化
+    """
+
+    # 每次从 image_tags 读取的图片id跨度（控制建索引时的内存占用）
+    BUILD_CHUNK = 50000
+
+    def __init__(self, db: DBManager, refresh: bool = True):
+        self.db = db
+        self._postings: Dict[int, np.ndarray] = {}
+        if refresh:
+            self.refresh()
+        else:
+            self._load_columns()
+
+    # ---------------- 倒排索引维护 ----------------
+    def _watermark(self, conn) -> int:
+        value = conn.exec_driver_sql("SELECT value FROM search_meta WHERE key = 'indexed_image_id'").scalar()
+        return value or 0
+
+    def refresh(self) -> int:
+        """更新倒排索引并重新读取过滤用的列（分数等可能被 upsert 更新），返回倒排索引涉及的图片数"""
+        count = self._update_index()
+        self._load_columns()
+        return count
+
+    def _update_index(self) -> int:
+        """为 id 大于已索引位置的图片补建倒排索引，并修补已索引图片被改动的标签"""
+        with self.db.engine.begin() as conn:
+            watermark = self._watermark(conn)
+            max_id = conn.exec_driver_sql("SELECT MAX(id) FROM images").scalar() or 0
+            dirty = conn.exec_driver_sql("SELECT image_id, tag_id FROM search_dirty").fetchall()
+            if max_id <= watermark and not dirty:
+                return 0
+
+            new_parts: Dict[int, List[np.ndarray]] = {}
+            for low in range(watermark + 1, max_id + 1, self.BUILD_CHUNK):
+                rows = conn.exec_driver_sql(
+                    "SELECT tag_id, image_id FROM image_tags WHERE image_id BETWEEN ? AND ?",
+                    (low, min(low + self.BUILD_CHUNK - 1, max_id))
+                ).fetchall()
+                if not rows:
+                    continue
+                # 直接展平再重塑，np.array(rows) 会逐个探测 Row 对象的数组接口，非常慢
+                pairs = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+                pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+                tag_ids, starts = np.unique(pairs[:, 0], return_index=True)
+                for tag_id, image_ids in zip(tag_ids.tolist(), np.split(pairs[:, 1], starts[1:])):
+                    new_parts.setdefault(tag_id, []).append(image_ids)
+
+            # 新图片id都大于已索引的id，直接追加即保持有序
+            changed: Dict[int, np.ndarray] = {}
+            for tag_id, parts in new_parts.items():
+                changed[tag_id] = np.concatenate([self._load_postings(conn, tag_id)] + parts)
+
+            # 已索引图片的标签被改动：按当前关联重新决定这些图片是否在对应标签的倒排表中
+            dirty_images = {image_id for image_id, _ in dirty}
+            if dirty:
+                current = self.db.load_links(conn, "image_tags", "tag_id", sorted(dirty_images))
+                by_tag: Dict[int, List[int]] = {}
+                for image_id, tag_id in dirty:
+                    by_tag.setdefault(tag_id, []).append(image_id)
+                for tag_id, image_ids in by_tag.items():
+                    postings = changed[tag_id] if tag_id in changed else self._load_postings(conn, tag_id)
+                    present = [image_id for image_id in image_ids if tag_id in current.get(image_id, ())]
+                    postings = np.setdiff1d(postings, np.array(image_ids, dtype=np.int64), assume_unique=True)
+                    changed[tag_id] = np.union1d(postings, np.array(present, dtype=np.int64))
+                conn.exec_driver_sql("DELETE FROM search_dirty")
+
+            for tag_id, postings in changed.items():
+                self._postings[tag_id] = postings
+            updates = [(tag_id, encode_postings(postings)) for tag_id, postings in changed.items() if len(postings)]
+            emptied = [(tag_id,) for tag_id, postings in changed.items() if not len(postings)]
+            if updates:
+                conn.exec_driver_sql("INSERT OR REPLACE INTO tag_postings (tag_id, data) VALUES (?, ?)", updates)
+            if emptied:
+                conn.exec_driver_sql("DELETE FROM tag_postings WHERE tag_id = ?", emptied)
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO search_meta (key, value) VALUES ('indexed_image_id', ?)", (max(max_id, watermark),)
+            )
+
+        if max_id > watermark:
+            logger.info(f"倒排索引已更新: 图片id {watermark + 1}~{max_id}，涉及 {len(new_parts)} 个标签")
+        if dirty:
+            logger.info(f"倒排索引已修补: {len(dirty_images)} 张已有图片的标签有变化")
+        return max(max_id - watermark, 0) + len(dirty_images)
+
+    def rebuild(self) -> None:
+        """清空并重建倒排索引（数据库中的图片被删除或被其他工具直接修改后使用）"""
+        with self.db.engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM tag_postings")
+            conn.exec_driver_sql("DELETE FROM search_dirty")
+            conn.exec_driver_sql("DELETE FROM search_meta WHERE key = 'indexed_image_id'")
+        self._postings.clear()
+        self.refresh()
+
+    def _load_postings(self, conn, tag_id: int) -> np.ndarray:
+        if tag_id in self._postings:
+            return self._postings[tag_id]
+        data = conn.exec_driver_sql("SELECT data FROM tag_postings WHERE tag_id = ?", (tag_id,)).scalar()
+        postings = decode_postings(data) if data is not None else np.empty(0, dtype=np.int64)
+        self._postings[tag_id] = postings
+        return postings
+
+    def postings(self, tag: str) -> np.ndarray:
+        """标签对应的有序图片id（标签不存在时为空）"""
+        tag_id = TAG_VOCAB.ids.get(tag)
+        if tag_id is None:
+            return np.empty(0, dtype=np.int64)
+        with self.db.engine.connect() as conn:
+            return self._load_postings(conn, tag_id)
+
+    # ---------------- 列数据 ----------------
+    def _load_columns(self):
+        """把过滤用的列读入内存（按图片id排序）"""
+        with self.db.engine.connect() as conn:
+            rows = conn.exec_driver_sql("SELECT id, score, width, height, rating, site FROM images ORDER BY id").fetchall()
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.columns = {
+            "score": np.array([r[1] or 0 for r in rows], dtype=np.int64),
+            "width": np.array([r[2] or 0 for r in rows], dtype=np.int64),
+            "height": np.array([r[3] or 0 for r in rows], dtype=np.int64),
+        }
+        # 评级与站点取值很少，按类别编码
+        for name, position in (("rating", 4), ("site", 5)):
+            values = [(r[position] or "").lower() for r in rows]
+            categories, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+            self.columns[name] = (codes, {c: i for i, c in enumerate(categories)})
+
+    def _artist_images(self, names: List[str]) -> np.ndarray:
+        with self.db.engine.connect() as conn:
+            placeholders = ",".join("?" * len(names))
+            rows = conn.exec_driver_sql(
+                f"SELECT DISTINCT ia.image_id FROM image_artists ia JOIN artists a ON a.id = ia.artist_id "
+                f"WHERE lower(a.name) IN ({placeholders})", tuple(names)
+            ).scalars().all()
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    # ---------------- 检索 ----------------
+    def match_ids(self, query) -> np.ndarray:
+        """返回满足条件的图片主键（有序）"""
+        parsed = parse_query(query) if isinstance(query, str) else query
+
+        # 标签交集从最短的倒排表开始
+        include = sorted((self.postings(tag) for tag in parsed.include), key=len)
+        result = include[0] if include else self.ids
+        for postings in include[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+
+        if parsed.any_of:
+            union = np.unique(np.concatenate([self.postings(tag) for tag in parsed.any_of]))
+            result = np.intersect1d(result, union, assume_unique=True)
+        for tag in parsed.exclude:
+            result = np.setdiff1d(result, self.postings(tag), assume_unique=True)
+
+        for key, names, negate in parsed.values:
+            if key != "artist":
+                continue
+            artist_ids = self._artist_images(names)
+            result = np.setdiff1d(result, artist_ids, assume_unique=True) if negate else np.intersect1d(result, artist_ids, assume_unique=True)
+
+        if not len(result):
+            return result
+
+        # 列条件：先定位到列数组中的行
+        positions = np.searchsorted(self.ids, result)
+        valid = (positions < len(self.ids))
+        valid[valid] = self.ids[positions[valid]] == result[valid]
+        result, positions = result[valid], positions[valid]
+        mask = np.ones(len(result), dtype=bool)
+
+        for key, low, high, negate in parsed.ranges:
+            values = self.columns[key][positions]
+            hit = np.ones(len(values), dtype=bool)
+            if low is not None:
+                hit &= values >= low
+            if high is not None:
+                hit &= values <= high
+            mask &= ~hit if negate else hit
+
+        for key, names, negate in parsed.values:
+            if key == "artist":
+                continue
+            codes, lookup = self.columns[key]
+            wanted = [lookup[name] for name in names if name in lookup]
+            hit = np.isin(codes[positions], wanted)
+            mask &= ~hit if negate else hit
+
+        return result[mask]
+
+    def search(self, query: str, limit: int = 100, offset: int = 0) -> Tuple[int, List[dict]]:
+        """执行检索，返回 (命中总数, 按排序取出的一页结果)"""
+        parsed = parse_query(query)
+        matched = self.match_ids(parsed)
+        column, descending = ORDERS[parsed.order]
+
+        if column == "score":
+            scores = self.columns["score"][np.searchsorted(self.ids, matched)]
+            order = np.lexsort((matched, scores))
+            matched = matched[order]
+        if descending:
+            matched = matched[::-1]
+        page = matched[offset:offset + limit].tolist()
+        if not page:
+            return len(matched), []
+
+        with self.db.engine.connect() as conn:
+            placeholders = ",".join("?" * len(page))
+            rows = conn.exec_driver_sql(
+                f"SELECT id, post_id, site, rating, score, width, height, file_url, posted_at FROM images WHERE id IN ({placeholders})",
+                tuple(page)
+            ).mappings().all()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return len(matched), [by_id[i] for i in page if i in by_id]
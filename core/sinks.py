@@ -0,0 +1,91 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from core.models import ImageItem
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Sink(ABC):
+    """流式抓取的数据出口：每抓到一页调用一次 write"""
+
+    async def open(self, progress=None) -> None:
+        """抓取开始前调用，progress 为流水线共用的进度条"""
+        pass
+
+    @abstractmethod
+    async def write(self, items: List[ImageItem]) -> None:
+        """处理一页数据"""
+        pass
+
+    async def close(self, exc: Optional[BaseException] = None) -> None:
+        """抓取结束后调用（无论成功与否），exc 为流水线中止时的异常"""
+        pass
+
+
+class CsvSink(Sink):
+    """逐页追加到画师/标签CSV与汇总表datas.csv"""
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+
+    def _save(self, items):
+        self.data_manager.save_as_csv(items)
+        self.data_manager.save_to_summary_csv(items)
+
+    async def write(self, items):
+        # pandas写文件是阻塞操作，放到线程中执行避免卡住抓取
+        await asyncio.to_thread(self._save, items)
+
+
+class DatabaseSink(Sink):
+    """逐页写入SQLite数据库"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    async def write(self, items):
+        await asyncio.to_thread(self.db_manager.save_items, items)
+
+
+class ParquetSink(Sink):
+    """逐页写入按站点分区的 Parquet 数据集（内部攒批落盘，结束时写出剩余数据）"""
+
+    def __init__(self, dataset, artist: str = "", query: str = ""):
+        self.dataset = dataset
+        self.artist = artist
+        self.query = query
+
+    async def write(self, items):
+        await asyncio.to_thread(self.dataset.write, items, self.artist, self.query)
+
+    async def close(self, exc=None):
+        # 中止时已写入的数据同样有效，照常落盘
+        await asyncio.to_thread(self.dataset.close)
+
+
+class DownloadSink(Sink):
+    """边抓取边下载：每页条目立即进入下载队列，队列满时反压抓取"""
+
+    def __init__(self, downloader, download_videos: bool, queue_size: int = 200):
+        self.downloader = downloader
+        self.download_videos = download_videos
+        self.queue_size = queue_size
+        self.stream = None
+
+    async def open(self, progress=None):
+        self.stream = self.downloader.stream(self.download_videos, self.queue_size, progress)
+        await self.stream.__aenter__()
+
+    async def write(self, items):
+        await self.stream.submit(items)
+
+    async def close(self, exc=None):
+        # 流水线中止时把异常传给下载会话，取消下载协程而不是等队列下载完
+        if self.stream:
+            stream, self.stream = self.stream, None
+            if exc is None:
+                await stream.__aexit__(None, None, None)
+            else:
+                await stream.__aexit__(type(exc), exc, exc.__traceback__)
@@ -1,9 +1,12 @@
 import pandas as pd
 import os
 from typing import List
+from collections import Counter
+import json
+import zlib
 from .models import ImageItem
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+from .idindex import IdIndex, make_keys
+from wordcloud import WordCloud, STOPWORDS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,11 +14,14 @@ logger = logging.getLogger(__name__)
 
 class DataManager:
     def __init__(self, file_path: str, artist: str, tags: str, stop_words: set[str]) -> None:
+        self.data_dir = file_path
         self.file_path = file_path
-        self.existing_ids = set()
         self.artist = artist
         self.tags = tags
         self.stop_words = stop_words
+        # 每个CSV的 (site, id) 索引持久化在CSV旁，启动时不再重读整个CSV
+        self._indexes: dict[str, IdIndex] = {}
+        self._makeup_filepath()
 
     def _makeup_filepath(self):
         if self.artist:
@@ -24,79 +30,56 @@ class DataManager:
             filename_base = self.tags.replace(' ', '_')
 
         full_filename = f"{filename_base}.csv"
-        self.file_path = os.path.join(self.file_path, full_filename)
+        self.file_path = os.path.join(self.data_dir, full_filename)
 
-    def _load_existing_ids(self, file_path=None):
-        """读取CSV中的ID用于去重"""
-        if file_path:
-            target_path = file_path
-            self.existing_ids = set()
-        else:
-            self._makeup_filepath()
-            target_path = self.file_path
+    def _index_for(self, file_path: str) -> IdIndex:
+        """每个CSV对应一个持久化的 (site, id) 索引，只打开一次"""
+        index = self._indexes.get(file_path)
+        if index is None:
+            index = self._indexes[file_path] = IdIndex(file_path)
+        return index
 
-        if not os.path.exists(target_path):
-            logger.debug(f"文件不存在，跳过去重: {target_path}")
-            return
+    def _append_new(self, image_items: List[ImageItem], path: str) -> int:
+        """按 (site, id) 过滤掉已收录的数据后追加写入CSV，返回写入条数"""
+        index = self._index_for(path)
+        keys = make_keys((item.site for item in image_items), (item.id for item in image_items))
+        new_positions = index.filter_new(keys)
 
-        try:
-            df = pd.read_csv(target_path, usecols=['Id'])
-            self.existing_ids = set(df['Id'].astype(str))
-            logger.debug(f"加载 {len(self.existing_ids)} 条已有ID")
-        except Exception as e:
-            logger.debug(f"读取ID列出错（文件可能为空）: {e}")
+        logger.debug(f"过滤去重: {len(image_items)} -> {len(new_positions)} 条新数据 ({path})")
+        if not len(new_positions):
+            return 0
+
+        if self._write_to_csv([image_items[i] for i in new_positions], path):
+            index.add(keys[new_positions])
+        return len(new_positions)
 
     def save_as_csv(self, image_items: List[ImageItem]) -> None:
         """保存到单独的画师/标签CSV文件"""
         if not image_items:
             return
 
-        self._load_existing_ids()
-        new_items_to_save: List[ImageItem] = []
-
-        for item in image_items:
-            item_id_str = str(item.id) 
-            if item_id_str not in self.existing_ids:
-                new_items_to_save.append(item)
-                self.existing_ids.add(item_id_str)
-
-        logger.debug(f"过滤去重: {len(image_items)} -> {len(new_items_to_save)} 条新数据")
-
-        if not new_items_to_save:
+        saved = self._append_new(image_items, self.file_path)
+        if not saved:
             logger.info(f"没有新数据需要写入: {self.file_path}")
             return
 
-        self._write_to_csv(new_items_to_save, self.file_path)
-        logger.info(f"保存 {len(new_items_to_save)} (共{len(image_items)}) 条数据到画师表")
+        logger.info(f"保存 {saved} (共{len(image_items)}) 条数据到画师表")
 
     def save_to_summary_csv(self, image_items: List[ImageItem]) -> None:
         """保存到汇总数据表datas.csv"""
         if not image_items:
             return
 
-        base_dir = os.path.dirname(self.file_path)
-        summary_path = os.path.join(base_dir, "datas.csv")
-
-        self._load_existing_ids(file_path=summary_path)
-
-        new_items_for_summary = []
-        for item in image_items:
-            item_id_str = str(item.id)
-            if item_id_str not in self.existing_ids:
-                new_items_for_summary.append(item)
-                self.existing_ids.add(item_id_str)
-
-        logger.debug(f"过滤汇总表: {len(image_items)} -> {len(new_items_for_summary)} 条新数据")
-
-        if not new_items_for_summary:
+        summary_path = os.path.join(self.data_dir, "datas.csv")
+        saved = self._append_new(image_items, summary_path)
+        if not saved:
             logger.info(f"没有新数据需要写入汇总表")
             return
 
-        self._write_to_csv(new_items_for_summary, summary_path)
-        logger.info(f"保存 {len(new_items_for_summary)} (共{len(image_items)}) 条数据到汇总表")
+        logger.info(f"保存 {saved} (共{len(image_items)}) 条数据到汇总表")
 
-    def _write_to_csv(self, items: List[ImageItem], path: str):
-        """写入CSV文件"""
+    def _write_to_csv(self, items: List[ImageItem], path: str) -> bool:
+        """写入CSV文件，返回是否成功"""
         datalist = [item.to_dict(artist=self.artist) for item in items]
         df = pd.DataFrame(datalist)
 
@@ -110,10 +93,67 @@ class DataManager:
                 header=not file_exists,
                 encoding='utf-8-sig'
             )
+            return True
         except Exception as e:
             logger.error(f"保存CSV失败 {path}: {e}")
+            return False
 
-    def generate_wordcloud(self):
+    def _load_freq_cache(self, csv_path: str, cache_path: str) -> tuple[Counter, int]:
+        """读取频次缓存，CSV被改写（不再是缓存时的追加延续）时作废"""
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            offset = cache["offset"]
+            if os.path.getsize(csv_path) >= offset and self._tail_checksum(csv_path, offset) == cache["check"]:
+                return Counter(cache["counts"]), offset
+            logger.debug(f"CSV已被改写，重新统计标签频次: {csv_path}")
+        except (OSError, ValueError, KeyError):
+            pass
+        return Counter(), 0
+
+    @staticmethod
+    def _tail_checksum(csv_path: str, offset: int) -> int:
+        """已统计部分末尾4KB的校验值，用于判断CSV是否只是在末尾追加"""
+        with open(csv_path, "rb") as f:
+            start = max(0, offset - 4096)
+            f.seek(start)
+            return zlib.crc32(f.read(offset - start))
+
+    def count_tag_frequencies(self, csv_path: str, chunk_size: int = 100000) -> Counter:
+        """
+        按块流式统计CSV中的标签频次（跳过含 ':' 的元标签与纯数字标签）
+        结果与已读取的位置缓存在CSV旁，之后只统计新追加的行
+        """
+        cache_path = csv_path + ".freq.json"
+        counts, offset = self._load_freq_cache(csv_path, cache_path)
+
+        columns = pd.read_csv(csv_path, nrows=0, encoding='utf-8-sig').columns
+        if "Tags" not in columns:
+            raise ValueError("CSV中缺少Tags列")
+
+        with open(csv_path, "rb") as f:
+            if offset == 0:
+                f.readline()
+            else:
+                f.seek(offset)
+            new_rows = 0
+            reader = pd.read_csv(f, header=None, names=columns, usecols=["Tags"], dtype=str, chunksize=chunk_size, encoding='utf-8')
+            for chunk in reader:
+                new_rows += len(chunk)
+                tags = chunk["Tags"].dropna().str.split().explode().dropna()
+                tags = tags[~tags.str.contains(":", regex=False) & ~tags.str.isdigit()]
+                counts.update(tags.value_counts().to_dict())
+            offset = f.tell()
+
+        logger.debug(f"统计标签频次: 新增 {new_rows} 行，共 {len(counts)} 种标签")
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": offset, "check": self._tail_checksum(csv_path, offset), "counts": counts}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+        return counts
+
+    def generate_wordcloud(self, frequencies: dict = None):
+        """生成词云；frequencies 为预先统计好的标签频次（如数据库统计表），不传时统计CSV"""
         csv_path = self.file_path
         if not csv_path:
             logger.warning(f"CSV路径未设置")
@@ -122,35 +162,18 @@ class DataManager:
         logger.debug(f"读取数据生成词云: {csv_path}")
 
         try:
-            df = pd.read_csv(csv_path)
-            logger.debug(f"读取 {len(df)} 条记录")
-
             file_name_no_ext = os.path.splitext(os.path.basename(csv_path))[-2]
             output_image_name = f"{file_name_no_ext}.png"
             save_path = os.path.join(os.path.dirname(csv_path), output_image_name)
 
-            if "Tags" not in df.columns:
-                logger.warning("CSV中缺少Tags列")
-                return
-
-            text_data = ""
+            counts = frequencies if frequencies is not None else self.count_tag_frequencies(csv_path)
+            # 停用词在渲染时过滤（修改停用词后无需重新统计）
+            frequencies = {
+                tag: count for tag, count in counts.items()
+                if tag not in self.stop_words and tag not in STOPWORDS and ":" not in tag and not tag.isdigit()
+            }
 
-            for tags_str in df["Tags"].dropna():
-                tags_list = tags_str.split(" ")
-
-                for tag in tags_list:
-                    tag = tag.strip()
-                    if ":" in tag:
-                        continue
-
-                    if tag.isdigit():
-                        continue
-
-                    cleaned = tag
-                    if cleaned and cleaned not in self.stop_words:
-                        text_data += cleaned + " "
-
-            if not text_data:
+            if not frequencies:
                 logger.warning("没有提取到有效标签")
                 return
 
@@ -163,16 +186,10 @@ class DataManager:
                 max_words=50,
                 font_path='msyh.ttc',
                 collocations=False
-            ).generate(text_data)
-
-            plt.figure(figsize=(16, 9))
-            plt.imshow(wc, interpolation='bilinear')
-            plt.axis('off')
-            plt.tight_layout(pad=0)
+            ).generate_from_frequencies(frequencies)
 
             wc.to_file(save_path)
             logger.info(f"词云已保存: {save_path}")
-            # plt.show()
 
         except Exception as e:
             logger.error(f"生成词云失败: {e}")
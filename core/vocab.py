@@ -0,0 +1,91 @@
+from array import array
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TagVocabulary:
+    """
+    标签字典：标签名 <-> 整数id，用于把空格分隔的标签字符串压缩成整数id数组
+    使用数据库时 id 与 tags.id 一致：由 DBManager 从 tags 表加载，新标签写库后由数据库分配id再登记回字典
+    尚未写库的标签先使用临时id（从 PROVISIONAL_BASE 开始，不会与数据库id冲突），多个进程同时写库也不会分到相同的id
+    """
+
+    PROVISIONAL_BASE = 1 << 31
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        # 数据库id从1开始（与自增主键一致），0号位留空
+        self.names: List[Optional[str]] = [None]
+        # 临时id对应的标签名（下标 = id - PROVISIONAL_BASE），登记数据库id后仍保留，已编码的数组照常解码
+        self._provisional: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    @classmethod
+    def is_provisional(cls, tag_id: int) -> bool:
+        return tag_id >= cls.PROVISIONAL_BASE
+
+    def get_id(self, name: str) -> int:
+        """返回标签id，不存在时分配临时id"""
+        tag_id = self.ids.get(name)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self.ids.get(name)
+                if tag_id is None:
+                    tag_id = self.PROVISIONAL_BASE + len(self._provisional)
+                    name = sys.intern(name)
+                    self._provisional.append(name)
+                    self.ids[name] = tag_id
+        return tag_id
+
+    def name_of(self, tag_id: int) -> Optional[str]:
+        if tag_id >= self.PROVISIONAL_BASE:
+            index = tag_id - self.PROVISIONAL_BASE
+            return self._provisional[index] if index < len(self._provisional) else None
+        return self.names[tag_id] if 0 <= tag_id < len(self.names) else None
+
+    def load(self, pairs: Iterable[Tuple[int, str]]) -> int:
+        """
+        登记数据库中的 (id, 标签名)，之后编码该标签时使用数据库id
+        已分配临时id的标签改用数据库id；同一标签或同一id对应不同的数据库记录时报错
+        """
+        count = 0
+        with self._lock:
+            for tag_id, name in pairs:
+                current = self.ids.get(name)
+                if current == tag_id:
+                    continue
+                if (current is not None and not self.is_provisional(current)) or self.name_of(tag_id) is not None:
+                    raise RuntimeError(f"标签字典id冲突: {name!r} -> {tag_id}（同一进程中使用了不同的数据库？）")
+                if tag_id >= len(self.names):
+                    self.names.extend([None] * (tag_id + 1 - len(self.names)))
+                name = sys.intern(name)
+                self.names[tag_id] = name
+                self.ids[name] = tag_id
+                count += 1
+        logger.debug(f"载入标签字典 {count} 条，共 {len(self.ids)} 条")
+        return count
+
+    def encode(self, tags_str: str) -> array:
+        """标签字符串 -> 紧凑的 uint32 id数组（保持原顺序，每个标签只占4字节）"""
+        if not tags_str:
+            return array("I")
+        return array("I", [self.get_id(t) for t in tags_str.split()])
+
+    def decode(self, tag_ids: Iterable[int]) -> List[str]:
+        """id数组 -> 标签名列表"""
+        names, provisional, base = self.names, self._provisional, self.PROVISIONAL_BASE
+        return [names[i] if i < base else provisional[i - base] for i in tag_ids]
+
+
+# 进程内共用的标签字典
+TAG_VOCAB = TagVocabulary()
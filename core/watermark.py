@@ -0,0 +1,60 @@
+import os
+import json
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WatermarkStore:
+    """按 (站点, 检索语句) 记录已抓取的最大 post id 与最后抓取时间，用于增量抓取"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.marks = {}
+        self._load()
+
+    @staticmethod
+    def _key(site, query):
+        # 标签顺序不影响检索结果，统一排序后作为键
+        return f"{site.lower()}|{' '.join(sorted(query.split()))}"
+
+    def _load(self):
+        """加载本地水位记录"""
+        if not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                self.marks = json.load(f)
+            logger.debug(f"加载增量水位记录 {len(self.marks)} 条")
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取水位记录失败，将全量抓取: {e}")
+            self.marks = {}
+
+    def get(self, site, query):
+        """返回该检索上次抓取到的最大id，没有记录时返回None"""
+        mark = self.marks.get(self._key(site, query))
+        return mark["max_id"] if mark else None
+
+    def update(self, site, query, max_id):
+        """抓取完成后推进水位（只增不减）并写回文件"""
+        key = self._key(site, query)
+        old = self.marks.get(key, {}).get("max_id")
+        if max_id is not None and (old is None or max_id > old):
+            new_max = max_id
+        else:
+            new_max = old
+
+        self.marks[key] = {
+            "max_id": new_max,
+            "last_crawl": datetime.now().isoformat(timespec="seconds")
+        }
+
+        dirname = os.path.dirname(self.filepath)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.marks, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.filepath)
+        logger.debug(f"更新水位: {key} -> {new_max}")
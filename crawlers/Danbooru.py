@@ -1,15 +1,31 @@
 from .base import BaseBoard
 from core.models import ImageItem
 import re
-import requests
+from core.retry import RetryEngine
 import logging 
 
 logger = logging.getLogger(__name__)
 
 class Danbooru(BaseBoard):
-    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None):
-        super().__init__(api_key, user_id, proxy, headers)
+    # 普通账号最多翻到第1000页
+    MAX_OFFSET_PAGES = 1000
+    FIELD_MAP = {
+        "id": ("id",),
+        "url": ("file_url", "large_file_url"),
+        "tags": ("tag_string",),
+        "rating": ("rating",),
+        "width": ("image_width",),
+        "height": ("image_height",),
+        "source": ("source",),
+        "created_at": ("created_at",),
+        "score": ("score",),
+        "artist": ("tag_string_artist",),
+    }
+
+    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None, concurrency=None, retry_policy=None, pagination="auto", rate_limiter=None, http=None, decode=None):
+        super().__init__(api_key, user_id, proxy, headers, concurrency, retry_policy, pagination, rate_limiter, http, decode)
         self.base_url = "https://danbooru.donmai.us/posts.json"
+        self.count_url = "https://danbooru.donmai.us/counts/posts.json"
 
     def get_safe_tag_name(self, tags: str) -> str:
         """清洗标签为合法的文件名（空格转下划线，移除冒号和特殊字符）"""
@@ -49,10 +65,29 @@ class Danbooru(BaseBoard):
         if self.api_key and self.user_id:
             params["login"] = self.user_id 
             params["api_key"] = self.api_key
+
+        # 只返回需要的字段（posts.json 默认带几十个字段和多个媒体变体URL）
+        if self.field_projection:
+            params["only"] = ",".join(self.projected_fields())
             
         logger.debug(f"构建参数: page={page+1}, limit={limit}, tags={tags[:30]}...")
         return params
     
+    def _cursor_tags(self, tags):
+        """b<id> 分页只适用于默认的 id 倒序，去掉等价的 order 标签"""
+        tokens = tags.split()
+        order_tokens = [t for t in tokens if t.startswith("order:")]
+        if any(t not in ("order:id_desc", "order:id:desc") for t in order_tokens):
+            return None
+        return " ".join(t for t in tokens if not t.startswith("order:"))
+
+    def _build_cursor_params(self, tags, before_id, limit):
+        """游标分页：page=b<id> 表示返回 id 小于该值的下一页"""
+        params = self._build_params(tags, 0, limit)
+        if before_id is not None:
+            params["page"] = f"b{before_id}"
+        return params
+    
     def _parse_json_list(self, json_data):
         """解析JSON数据（Danbooru直接返回列表）"""
         if isinstance(json_data, list):
@@ -69,9 +104,9 @@ class Danbooru(BaseBoard):
             logger.error(f"解析总数失败: {e}")
             return 0
 
-    def get_total_count(self, tags) -> int:
+    async def fetch_total_count(self, client, tags) -> int:
         """查询Danbooru的计数接口获取搜索结果总数"""
-        count_url = "https://danbooru.donmai.us/counts/posts.json"
+        count_url = self.count_url
         
         params = {"tags": tags}
         
@@ -79,22 +114,13 @@ class Danbooru(BaseBoard):
             params["login"] = self.user_id
             params["api_key"] = self.api_key
 
-        req_proxies = None
-        if self.proxy and isinstance(self.proxy, str):
-            req_proxies = {"http": self.proxy, "https": self.proxy}
-
         logger.debug(f"获取总数: {count_url}?tags={tags[:30]}...")
         try:
-            response = requests.get(
-                count_url, 
-                params=params, 
-                headers=self.headers, 
-                proxies=req_proxies, 
-                timeout=10
+            json_data = await RetryEngine(self.retry_policy).call(
+                lambda: self._request_json(client, count_url, params, timeout=10),
+                label="获取总数"
             )
-            response.raise_for_status()
-            
-            return self._get_count(response.json())
+            return self._get_count(json_data)
             
         except Exception as e:
             logger.error(f"获取总数失败: {e}")
@@ -134,5 +160,6 @@ class Danbooru(BaseBoard):
             created_at=created_at,
             score=raw_post.get("score"),
             site="Danbooru",
-            artist=raw_post.get("tag_string_artist", "")
+            # 多位画师时 tag_string_artist 以空格分隔，统一为逗号分隔（与画师名单匹配结果一致）
+            artist=", ".join((raw_post.get("tag_string_artist") or "").split())
         )
\ No newline at end of file
@@ -1,15 +1,32 @@
 from .base import BaseBoard
 from core.models import ImageItem
 import re
-import requests
+from core.retry import RetryEngine
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Gelbooru(BaseBoard):
-    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None):
-        super().__init__(api_key, user_id, proxy, headers)
+    # Gelbooru 限制 pid * limit <= 20000
+    MAX_OFFSET_PAGES = 20000 // BaseBoard.MAX_LIMIT
+    # 翻页响应的 @attributes 中带有总数
+    COUNT_IN_PAGE = True
+    # Gelbooru DAPI 不支持服务端字段裁剪，这里仅作为字段说明
+    FIELD_MAP = {
+        "id": ("id",),
+        "url": ("file_url",),
+        "tags": ("tags",),
+        "rating": ("rating",),
+        "width": ("width",),
+        "height": ("height",),
+        "source": ("source",),
+        "created_at": ("created_at",),
+        "score": ("score",),
+    }
+
+    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None, concurrency=None, retry_policy=None, pagination="auto", rate_limiter=None, http=None, decode=None):
+        super().__init__(api_key, user_id, proxy, headers, concurrency, retry_policy, pagination, rate_limiter, http, decode)
         self.base_url = "https://gelbooru.com/index.php?page=dapi&s=post&q=index"
         
     @staticmethod
@@ -48,12 +65,34 @@ class Gelbooru(BaseBoard):
         logger.debug(f"构建参数: page={page}, limit={limit}, tags={tags[:30]}...")
         return params
     
+    def _cursor_tags(self, tags):
+        """游标模式需要按 id 倒序（默认排序或 sort:id:desc）"""
+        tokens = tags.split()
+        sort_tokens = [t for t in tokens if t.startswith("sort:")]
+        if any(t not in ("sort:id", "sort:id:desc") for t in sort_tokens):
+            return None
+        tokens = [t for t in tokens if not t.startswith("sort:")]
+        tokens.append("sort:id:desc")
+        return " ".join(tokens)
+
+    def _build_cursor_params(self, tags, before_id, limit):
+        """游标分页：通过 id:<N 元标签缩小范围，始终请求 pid=0"""
+        if before_id is not None:
+            tags = f"{tags} id:<{before_id}"
+        return self._build_params(tags, 0, limit)
+    
     def _parse_json_list(self, json_data):
         """解析JSON数据（Gelbooru返回在post键中）"""
         if isinstance(json_data, dict):
             return json_data.get("post", [])
         return []
 
+    def _page_total(self, json_data):
+        """翻页响应的 @attributes 中带有结果总数"""
+        if isinstance(json_data, dict) and "@attributes" in json_data:
+            return int(json_data["@attributes"]["count"])
+        return None
+
     def _get_count(self, response_json):
         """从响应中提取图片总数"""
         if "@attributes" in response_json:
@@ -65,23 +104,17 @@ class Gelbooru(BaseBoard):
                 logger.info("未检索到图片")
         return 0
     
-    def get_total_count(self, tags) -> int:
+    async def fetch_total_count(self, client, tags) -> int:
         """发送探测请求，获取搜索结果总数量"""
-        req_proxies = None
-        if self.proxy and isinstance(self.proxy, str):
-            req_proxies = {
-                "http": self.proxy,
-                "https": self.proxy
-            }
-        
         probe_params = self._build_params(tags, page=0, limit=1)
         logger.debug(f"获取总数: base_url?tags={tags[:30]}...")
         
         try:
-            response = requests.get(self.base_url, params=probe_params, proxies=req_proxies, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            
-            return self._get_count(response.json())
+            json_data = await RetryEngine(self.retry_policy).call(
+                lambda: self._request_json(client, self.base_url, probe_params, timeout=10),
+                label="获取总数"
+            )
+            return self._get_count(json_data)
         except Exception as e:
             logger.error(f"获取总数失败: {e}")
             return 0
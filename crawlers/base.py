@@ -1,23 +1,71 @@
 from abc import ABC, abstractmethod
 from core.models import ImageItem
+from core.concurrency import AIMDController, ConcurrencyPolicy
+from core.retry import RetryEngine, RetryPolicy, HTTPStatusError, parse_retry_after
+from core.ratelimit import RateLimiter, shared_limiter
+from core.http import HttpClient, client_scope
+from core.codec import DecodeConfig, create_decode_pool, loads
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 import aiohttp
 import asyncio
 import math
-from typing import List
+from typing import AsyncIterator, List, Optional
 import logging 
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, MofNCompleteColumn
-from core.log_config import console
+from contextlib import nullcontext
+from rich.progress import Progress
+from core.log_config import create_progress
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class PageResult:
+    """一页响应的解码结果"""
+    items: List[ImageItem]
+    raw_count: int               # 原始条目数（含转换时被丢弃的）
+    min_id: Optional[int]        # 原始条目中的最小id（游标分页用）
+    total: Optional[int] = None  # 响应中附带的结果总数（部分站点提供）
+
+
+def _decode_in_worker(board_cls, payload: bytes) -> PageResult:
+    """进程池入口：子进程中没有爬虫实例，构造一个不带网络状态的空实例来复用解析逻辑"""
+    board = board_cls.__new__(board_cls)
+    return board._decode_page(payload)
+
+
 class BaseBoard(ABC):
     MAX_LIMIT = 100
+    # 站点允许的最大页码数（超过后 offset 分页会被拒绝）
+    MAX_OFFSET_PAGES = 1000
+    # 翻页接口的响应中是否带有结果总数（为True时无需单独请求计数接口）
+    COUNT_IN_PAGE = False
+    # ImageItem 字段 -> 站点原始字段（_normalize_data 实际读取的字段，用于服务端字段裁剪）
+    FIELD_MAP: dict = {}
     
-    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None):
+    def __init__(self, api_key=None, user_id=None, proxy=None, headers=None, concurrency: ConcurrencyPolicy = None, retry_policy: RetryPolicy = None, pagination: str = "auto", rate_limiter: RateLimiter = None, http: HttpClient = None, decode: DecodeConfig = None):
         self.api_key = api_key
         self.user_id = user_id
         self.proxy = proxy
         self.headers = headers
+        self.concurrency = concurrency or ConcurrencyPolicy()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or shared_limiter
+        # 共享的HTTP客户端；为空时每次抓取临时创建
+        self.http = http
+        # probe 预取的第1页：(检索标签, PageResult)
+        self._first_page = None
+        self.decode = decode or DecodeConfig()
+        # 是否让服务器只返回 FIELD_MAP 中的字段（站点支持时）
+        self.field_projection = True
+        self._pool = None
+        self.failed_pages: List[int] = []
+        # 上一次抓取是否完整（有失败页或游标中断时为False，增量水位不应推进）
+        self.crawl_complete = True
+        # 上一次完整抓取请求的数量（补抓失败页时用于截断最后一页）
+        self.last_limit = 0
+        # "offset"：页码分页；"cursor"：按 id 游标分页；"auto"：超过页码上限时自动切换游标
+        self.pagination = pagination
         self.base_url = ""
     
     # 在子类中应该是一个静态方法 只获取config.SEARCH_TAGS 放在不同的子类下实现不同的清洗逻辑
@@ -55,6 +103,16 @@ class BaseBoard(ABC):
         """子类实现：组装URL参数"""
         pass
     
+    @classmethod
+    def projected_fields(cls) -> List[str]:
+        """根据 FIELD_MAP 得出需要向服务器请求的原始字段（保持顺序、去重）"""
+        fields = []
+        for raw_keys in cls.FIELD_MAP.values():
+            for key in raw_keys:
+                if key not in fields:
+                    fields.append(key)
+        return fields
+
     @abstractmethod
     def _parse_json_list(self, json_data) -> list:
         """子类实现：解析JSON数据"""
@@ -66,104 +124,368 @@ class BaseBoard(ABC):
         pass
     
     @abstractmethod
-    def get_total_count(self, tags) -> int:
-        """发送测试请求，返回搜索结果的总数量"""
+    async def fetch_total_count(self, client: HttpClient, tags) -> int:
+        """子类实现：发送探测请求，返回搜索结果的总数量"""
         pass
-    
-    
-    async def _fetch_page_async(self, session, tags, page, limit, semaphore, progress, task_id):
-        """协程：抓取单页数据"""
-        async with semaphore:
-            params = self._build_params(tags, page, limit)
-            page += 1
-            req_proxy = self.proxy if isinstance(self.proxy, str) else None
-            
+
+    async def probe(self, client: HttpClient, tags) -> int:
+        """
+        获取总数的同时抓取第1页：返回总数，第1页解码结果缓存起来供随后的抓取直接复用
+        COUNT_IN_PAGE 为 True 的站点直接从第1页响应中读取总数，省掉单独的计数请求
+        """
+        params = self._build_params(tags, 0, self.MAX_LIMIT)
+        retry = RetryEngine(self.retry_policy)
+
+        async def first_page():
+            payload = await retry.call(
+                lambda: self._request_bytes(client, self.base_url, params),
+                label="第 1 页"
+            )
+            return await self._decode(payload)
+
+        if self.COUNT_IN_PAGE:
             try:
-                timeout = aiohttp.ClientTimeout(total=20)
-                async with session.get(self.base_url, params=params, headers=self.headers, proxy=req_proxy, timeout=timeout, ssl=False) as response:
-                    if response.status != 200:
-                        logger.warning(f"第 {page} 页请求失败: HTTP {response.status}")
-                        return []
-                    
-                    json_data = await response.json()
-                    raw_posts = self._parse_json_list(json_data)
-                    
-                    valid_items = []
-                    for raw_post in raw_posts:
-                        item = self._normalize_data(raw_post)
-                        if item:
-                            valid_items.append(item)
-                    
-                    logger.debug(f"第{page}页获取{len(valid_items)}条有效数据")
-                    await asyncio.sleep(0.5)
-                    return valid_items
-                
+                result = await first_page()
             except Exception as e:
-                logger.error(f"第 {page} 页抓取失败: {e}")
-                return []
-            
-            finally:
-                # pbar.update(1)
-                progress.update(task_id, advance=1)
+                logger.error(f"获取总数失败: {e}")
+                return 0
+            count = result.total or 0
+            if count:
+                logger.info(f"获取总数: {count} 张图片")
+            else:
+                logger.info("未检索到图片")
+        else:
+            count, result = await asyncio.gather(self.fetch_total_count(client, tags), first_page(), return_exceptions=True)
+            if isinstance(count, BaseException):
+                logger.error(f"获取总数失败: {count}")
+                count = 0
+            if isinstance(result, BaseException):
+                # 第1页预取失败不影响后续抓取，届时重新请求
+                logger.debug(f"预取第1页失败: {result!r}")
+                return count
+
+        self._first_page = (tags, result)
+        return count
+
+    def _take_first_page(self, tags) -> Optional["PageResult"]:
+        """取出探测阶段缓存的第1页（只用一次，检索条件不同时丢弃）"""
+        cached, self._first_page = self._first_page, None
+        if cached and cached[0] == tags:
+            logger.debug("复用探测阶段获取的第1页数据")
+            return cached[1]
+        return None
 
-    async def _fetch_posts_core(self, tags: str, limit_num: int) -> List[ImageItem]:
-        """异步批量获取元数据"""
-        target_count = limit_num
-        total_pages = math.ceil(target_count / self.MAX_LIMIT)
+    async def _request_bytes(self, client: HttpClient, url, params, timeout: float = 20) -> bytes:
+        """单次GET请求并读取原始响应体（经过限速器），非200时抛出 HTTPStatusError"""
+        await self.rate_limiter.acquire(url)
+        async with client.get(url, params=params, headers=self.headers, timeout=aiohttp.ClientTimeout(total=timeout), ssl=False) as response:
+            if response.status != 200:
+                raise HTTPStatusError(response.status, parse_retry_after(response.headers.get("Retry-After")))
+            return await response.read()
+
+    async def _request_json(self, client: HttpClient, url, params, timeout: float = 20):
+        """单次GET请求并解析JSON（小响应，直接在事件循环中解码）"""
+        return loads(await self._request_bytes(client, url, params, timeout))
+
+    async def _request_posts(self, client: HttpClient, params, controller: AIMDController) -> bytes:
+        """单次请求一页原始数据（占用一个并发槽位），失败时抛出异常交给重试引擎"""
+        epoch = await controller.acquire()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        status = None
+        
+        try:
+            payload = await self._request_bytes(client, self.base_url, params)
+            status = 200
+            return payload
         
-        logger.info(f"准备获取 {target_count} 张图片，共 {total_pages} 页")
-        logger.debug(f"页面大小: {self.MAX_LIMIT}，并发数: 5")
+        except HTTPStatusError as e:
+            status = e.status
+            raise
 
-        semaphore = asyncio.Semaphore(5)
-        all_items = []
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+            status = "timeout"
+            raise
+        
+        finally:
+            await controller.release(epoch, loop.time() - start, status)
 
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            
-            with Progress(
-                TextColumn("        "),
-                SpinnerColumn(),
-                TextColumn("[cyan][progress.description]{task.description:<20}"),
-                BarColumn(),
-                MofNCompleteColumn(),
-                TaskProgressColumn(),
-                TimeRemainingColumn(),
-                console=console,
-                transient=False            
-            ) as progress:
-                
-                task_id = progress.add_task("正在抓取元数据...", total=total_pages)
-                
-                for page in range(total_pages):
-                    task = asyncio.create_task(
-                        self._fetch_page_async(
-                            session, tags, page, self.MAX_LIMIT, 
-                            semaphore, progress, task_id
-                        )
+    @property
+    def _decode_pool(self):
+        """解码线程池/进程池（首次使用时创建，inline 模式为None）"""
+        if self._pool is None and self.decode.mode != "inline":
+            self._pool = create_decode_pool(self.decode)
+        return self._pool
+
+    def close(self) -> None:
+        """释放解码线程池/进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def _normalize_posts(self, raw_posts) -> List[ImageItem]:
+        valid_items = []
+        for raw_post in raw_posts:
+            item = self._normalize_data(raw_post)
+            if item:
+                valid_items.append(item)
+        return valid_items
+
+    def _page_total(self, json_data) -> Optional[int]:
+        """子类可重写：从翻页响应中读取结果总数（COUNT_IN_PAGE 站点使用）"""
+        return None
+
+    def _decode_page(self, payload: bytes) -> "PageResult":
+        """解码一页响应并批量转换为 ImageItem（在解码线程/进程中执行）"""
+        json_data = loads(payload)
+        raw_posts = self._parse_json_list(json_data)
+        min_id = min((int(post["id"]) for post in raw_posts), default=None)
+        return PageResult(
+            items=self._normalize_posts(raw_posts),
+            raw_count=len(raw_posts),
+            min_id=min_id,
+            total=self._page_total(json_data)
+        )
+
+    async def _decode(self, payload: bytes) -> "PageResult":
+        """按配置在事件循环外解码页面，避免大页面的JSON解析与转换阻塞网络IO"""
+        pool = self._decode_pool
+        if pool is None:
+            result = self._decode_page(payload)
+        else:
+            loop = asyncio.get_running_loop()
+            if isinstance(pool, ProcessPoolExecutor):
+                result = await loop.run_in_executor(pool, _decode_in_worker, type(self), payload)
+            else:
+                result = await loop.run_in_executor(pool, self._decode_page, payload)
+        # 标签编码统一在主进程完成（标签字典是进程内共用的，子进程中分配的id无效）
+        for item in result.items:
+            item.encode_tags()
+        return result
+
+    async def _fetch_page_async(self, client, tags, page, limit, controller: AIMDController, retry: RetryEngine, progress, task_id):
+        """协程：抓取单页数据（带重试），最终失败的页码记入 failed_pages"""
+        label = f"第 {page + 1} 页"
+        params = self._build_params(tags, page, limit)
+        try:
+            payload = await retry.call(
+                lambda: self._request_posts(client, params, controller),
+                label=label
+            )
+            valid_items = (await self._decode(payload)).items
+            logger.debug(f"{label}获取{len(valid_items)}条有效数据")
+            return valid_items
+        except Exception as e:
+            logger.error(f"{label}抓取失败: {e!r}")
+            self.failed_pages.append(page)
+            return []
+        finally:
+            # pbar.update(1)
+            progress.update(task_id, advance=1)
+
+    # ---------------- 游标（keyset）分页 ----------------
+
+    def _cursor_tags(self, tags: str) -> Optional[str]:
+        """
+        子类实现：返回游标模式使用的搜索标签
+        游标分页要求结果按 id 倒序，排序不兼容时返回None
+        """
+        return None
+
+    @abstractmethod
+    def _build_cursor_params(self, tags, before_id, limit) -> dict:
+        """子类实现：组装"id小于before_id"的下一页参数（before_id为None表示第一页）"""
+        pass
+
+    def supports_incremental(self, tags: str) -> bool:
+        """增量抓取依赖按 id 倒序的游标分页，排序不兼容时不能增量抓取"""
+        return self._cursor_tags(tags) is not None
+
+    def _choose_pagination(self, tags: str, total_pages: int) -> str:
+        """根据配置与页数决定使用 offset 还是 cursor 分页"""
+        mode = self.pagination
+        if mode == "offset":
+            return "offset"
+
+        cursor_ok = self._cursor_tags(tags) is not None
+        if mode == "cursor":
+            if cursor_ok:
+                return "cursor"
+            logger.warning("当前排序方式不支持游标分页（需要按 id 倒序），改用页码分页")
+            return "offset"
+
+        # auto：超出站点页码上限时才切换到游标分页
+        if total_pages > self.MAX_OFFSET_PAGES:
+            if cursor_ok:
+                logger.info(f"请求页数 {total_pages} 超过页码上限 {self.MAX_OFFSET_PAGES}，使用游标分页")
+                return "cursor"
+            logger.warning(f"当前排序不支持游标分页，最多只能获取前 {self.MAX_OFFSET_PAGES} 页")
+        return "offset"
+
+    async def _fetch_posts_cursor(self, client, tags, limit_num, controller: AIMDController, retry: RetryEngine, progress, task_id, emit, since_id=None, first_page=None) -> None:
+        """
+        按 id 游标顺序翻页：每页代价恒定，且不受页码上限限制
+        每抓到一页调用 await emit(items)
+        since_id 不为空时为增量模式，遇到 id <= since_id 的已知数据即停止
+        first_page 为探测阶段已取得的第1页，直接复用
+        """
+        cursor_tags = self._cursor_tags(tags)
+        before_id = None
+        fetched = 0
+        page = 0
+
+        while fetched < limit_num:
+            label = f"第 {page + 1} 页(id<{before_id})" if before_id else "第 1 页"
+            if page == 0 and first_page is not None:
+                result = first_page
+                progress.update(task_id, advance=1)
+            else:
+                params = self._build_cursor_params(cursor_tags, before_id, self.MAX_LIMIT)
+                try:
+                    payload = await retry.call(
+                        lambda: self._request_posts(client, params, controller),
+                        label=label
                     )
-                    tasks.append(task)
-            
-            # with tqdm(total=total_pages, desc="获取页面元数据", unit="页") as pbar:
-            #     for page in range(total_pages):
-            #         task = asyncio.create_task(
-            #             self._fetch_page_async(session, tags, page, self.MAX_LIMIT, semaphore, pbar)
-            #         )
-            #         tasks.append(task)
-            
-                results = await asyncio.gather(*tasks)
-            
-            for page_items in results:
-                all_items.extend(page_items)
+                    result = await self._decode(payload)
+                except Exception as e:
+                    # 游标依赖上一页结果，失败后无法继续往下翻
+                    logger.error(f"{label}抓取失败，游标分页中止（可从 id<{before_id} 继续）: {e!r}")
+                    self.crawl_complete = False
+                    break
+                finally:
+                    progress.update(task_id, advance=1)
 
-        final_items = all_items[:target_count]
-        logger.info(f"元数据获取完成: {len(final_items)}/{target_count} 张图片/视频信息")
-        return final_items
-    
-    def start_crawling(self, tags: str, limit_num: int) -> List[ImageItem]:
-        """爬虫同步入口，供run.py直接调用"""
-        logger.debug(f"启动爬虫: 标签={tags}, 数量={limit_num}")
+            if not result.raw_count:
+                break
+
+            page_items = result.items
+            reached_known = False
+            if since_id is not None:
+                page_items = [item for item in page_items if int(item.id) > since_id]
+                reached_known = result.min_id <= since_id
+
+            fetched += len(page_items)
+            before_id = result.min_id
+            page += 1
+            logger.debug(f"{label}获取{len(page_items)}条数据，下一页游标 id<{before_id}")
+            await emit(page_items)
+
+            if reached_known:
+                logger.info(f"已到达上次抓取的位置 (id={since_id})，停止翻页")
+                break
+
+        # 提前停止时把进度条总数修正为实际页数
+        progress.update(task_id, total=page, completed=page)
+
+    async def _fetch_posts_offset(self, client, tags, limit_num, pages, controller: AIMDController, retry: RetryEngine, progress, task_id, emit, first_page=None) -> None:
+        """
+        按页码并发抓取：固定数量的worker按需领取页码，不预先为每页创建任务
+        first_page 为探测阶段已取得的第1页，直接复用
+        """
+        if first_page is not None and pages and pages[0] == 0:
+            progress.update(task_id, advance=1)
+            await emit(first_page.items[:limit_num])
+            pages = pages[1:]
+        if not pages:
+            return
+        page_iter = iter(pages)
+
+        async def worker():
+            for page in page_iter:
+                page_items = await self._fetch_page_async(
+                    client, tags, page, self.MAX_LIMIT,
+                    controller, retry, progress, task_id
+                )
+                # 最后一页只保留需要的数量
+                await emit(page_items[:max(0, limit_num - page * self.MAX_LIMIT)])
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency.max_concurrency, len(pages)))]
         try:
-            return asyncio.run(self._fetch_posts_core(tags, limit_num))
-        except RuntimeError:
-            loop = asyncio.get_event_loop()
-            return loop.run_until_complete(self._fetch_posts_core(tags, limit_num))
\ No newline at end of file
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+
+    def _plan_crawl(self, tags, limit_num, pages, since_id):
+        """确定分页模式，返回 (mode, pages, since_id, total_pages)"""
+        if since_id is not None and self._cursor_tags(tags) is None:
+            logger.warning("增量模式需要按 id 倒序检索，当前排序不支持，改为全量抓取")
+            since_id = None
+
+        if pages is not None:
+            return "offset", pages, since_id, len(pages)
+        
+        total_pages = math.ceil(limit_num / self.MAX_LIMIT)
+        if since_id is not None:
+            return "cursor", None, since_id, total_pages
+
+        mode = self._choose_pagination(tags, total_pages)
+        if mode == "cursor":
+            return "cursor", None, since_id, total_pages
+
+        total_pages = min(total_pages, self.MAX_OFFSET_PAGES)
+        return "offset", list(range(total_pages)), since_id, total_pages
+
+    async def iter_pages(self, tags: str, limit_num: int, pages: Optional[List[int]] = None, since_id: Optional[int] = None, queue_size: int = 8, progress: Optional[Progress] = None) -> AsyncIterator[List[ImageItem]]:
+        """
+        异步生成器：边抓取边逐页产出 ImageItem 列表
+        抓取结果经过有界队列传递，下游处理慢时会反压抓取，内存占用与总量无关
+        pages 指定时只抓取这些页码（用于补抓失败页）
+        since_id 指定时为增量模式：按 id 倒序翻页，到达已知id即停止
+        progress 指定时复用外部进度条（与下载进度同屏显示）
+        """
+        first_page = None
+        if pages is None:
+            self.last_limit = limit_num
+            first_page = self._take_first_page(tags)
+        mode, pages, since_id, total_pages = self._plan_crawl(tags, limit_num, pages, since_id)
+        self.failed_pages = []
+        self.crawl_complete = True
+        
+        logger.info(f"准备获取 {limit_num} 张图片，共 {total_pages} 页")
+        logger.debug(f"分页模式: {mode}，页面大小: {self.MAX_LIMIT}，并发数: {self.concurrency.min_concurrency}~{self.concurrency.max_concurrency} (自适应)")
+
+        controller = AIMDController(self.concurrency)
+        retry = RetryEngine(self.retry_policy)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        remaining = limit_num
+
+        async with client_scope(self.http, self.proxy) as client:
+            with nullcontext(progress) if progress else create_progress() as progress:
+                task_id = progress.add_task("正在抓取元数据...", total=total_pages, style="cyan")
+
+                async def produce():
+                    try:
+                        if mode == "cursor":
+                            await self._fetch_posts_cursor(client, tags, limit_num, controller, retry, progress, task_id, queue.put, since_id, first_page)
+                        else:
+                            await self._fetch_posts_offset(client, tags, limit_num, pages, controller, retry, progress, task_id, queue.put, first_page)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.error(f"抓取过程出错: {e!r}")
+                        self.crawl_complete = False
+                    # 结束标记
+                    await queue.put(None)
+
+                producer = asyncio.create_task(produce())
+                try:
+                    while remaining > 0:
+                        page_items = await queue.get()
+                        if page_items is None:
+                            break
+                        if not page_items:
+                            continue
+                        page_items = page_items[:remaining]
+                        remaining -= len(page_items)
+                        yield page_items
+                finally:
+                    producer.cancel()
+                    await asyncio.gather(producer, return_exceptions=True)
+
+        logger.debug(f"结束时并发上限: {controller.current_limit}，已用重试 {retry.budget.used}/{retry.budget.total}")
+        if self.failed_pages:
+            self.crawl_complete = False
+            self.failed_pages.sort()
+            logger.warning(f"{len(self.failed_pages)} 页在重试后仍失败: {self.failed_pages}")
+        logger.info(f"元数据获取完成: {limit_num - remaining}/{limit_num} 张图片/视频信息")
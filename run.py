@@ -7,10 +7,22 @@ from crawlers.Gelbooru import Gelbooru
 from crawlers.Danbooru import Danbooru
 from core.storage import DataManager
 from core.downloader import Downloader
-from core.roster import ArtistRoster
-from core.database import DBManager
+from core.roster import ArtistRoster, DBArtistRoster
+from core.database import DBManager, SQLiteProfile
+from core.concurrency import ConcurrencyPolicy
+from core.retry import RetryPolicy
+from core.watermark import WatermarkStore
+from core.pipeline import run_pipeline
+from core.sinks import CsvSink, DatabaseSink, DownloadSink, ParquetSink
+from core.dataset import ParquetDataset
+from core.ratelimit import shared_limiter
+from core.http import HttpClient, PoolConfig
+from core.codec import DecodeConfig
 from typing import Type
+from contextlib import AsyncExitStack
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -21,14 +33,17 @@ class CrawlerFactory:
     }
     
     @staticmethod
-    def get_crwaler(site: str) -> BaseBoard:
+    def get_crwaler(site: str, http: HttpClient = None) -> BaseBoard:
         crawler_type = CrawlerFactory.CRAWLERS.get(site.lower())
         if not crawler_type:
             supported = ", ".join(sorted(CrawlerFactory.CRAWLERS))
             raise ValueError(f"Invalid site: {site!r}. Supported: {supported}")
-        return crawler_type(api_key=config.API["api_key"], user_id=config.API["user_id"], headers=config.HEADERS, proxy=config.PROXY)
+        concurrency = ConcurrencyPolicy(**getattr(config, "CONCURRENCY", {}))
+        retry_policy = RetryPolicy(**getattr(config, "RETRY", {}))
+        decode = DecodeConfig(**getattr(config, "DECODE", {}))
+        return crawler_type(api_key=config.API["api_key"], user_id=config.API["user_id"], headers=config.HEADERS, proxy=config.PROXY, concurrency=concurrency, retry_policy=retry_policy, pagination=getattr(config, "PAGINATION", "auto"), http=http, decode=decode)
 
-def main():
+async def main():
     # 导入配置 ------------------------------------------------------------------
     # 网站接口
     headers = config.HEADERS
@@ -54,56 +69,106 @@ def main():
     download_videos = config.DOWNLOAD_VIDEOS
     database = config.DATABASE
     word_cloud = config.WORDCLOUD
+    save_parquet = getattr(config, "SAVE_PARQUET", False)
+    incremental = getattr(config, "INCREMENTAL", False)
     # --------------------------------------------------------------------------
 
+    # 限速规则（爬虫与下载器共用）
+    shared_limiter.configure(getattr(config, "RATE_LIMITS", None), getattr(config, "DEFAULT_RATE", None))
+
+    # 计数、翻页、下载共用一个连接池
+    http = HttpClient(proxy=proxy, pool=PoolConfig(**getattr(config, "HTTP_POOL", {})))
+
     # 实例化
-    crawler = CrawlerFactory.get_crwaler(site=site)
+    crawler = CrawlerFactory.get_crwaler(site=site, http=http)
     # 清洗标签（根据本站点规则）
     file_tags = crawler.get_safe_tag_name(base_tags)
     # 这里是用于保存文件的标签
     final_tags = crawler.assemble_tags(base_tags=base_tags, artist=artist, rating=rating, sort_by=sort_by, desc=desc)
 
     data_manager = DataManager(file_path=data_output_path, artist=artist, tags=file_tags, stop_words=stop_words)
-    downloader = Downloader(save_path=image_output_path, artist=artist, tags=file_tags, headers=headers, proxy=proxy)
+    retry_policy = RetryPolicy(**getattr(config, "RETRY", {}))
+    downloader = Downloader(save_path=image_output_path, artist=artist, tags=file_tags, headers=headers, proxy=proxy, retry_policy=retry_policy, http=http)
+    # 数据库会载入持久化的标签字典，必须在抓取（编码标签）之前创建
+    db_manager = DBManager(database_path, SQLiteProfile(**getattr(config, "SQLITE_PROFILE", {}))) if database else None
 
     logger.info(f"检索关键词: {final_tags}")
-    total_count = crawler.get_total_count(final_tags)
+    async with AsyncExitStack() as stack:
+        await stack.enter_async_context(http)
+        stack.callback(crawler.close)
+
+        # 计数与第1页并发获取，第1页在随后的抓取中直接复用
+        total_count = await crawler.probe(http, final_tags)
+        if not total_count:
+            return
 
-    if total_count:
         roster_path = data_output_path + rf"\artists_roster.txt"
-        roster = ArtistRoster(filepath=roster_path)
+        # 启用数据库时名单保存在数据库中，并从 Danbooru 作品的画师标签自动学习
+        if db_manager and getattr(config, "ROSTER_DB", True):
+            roster = DBArtistRoster(db_manager, filepath=roster_path)
+        else:
+            roster = ArtistRoster(filepath=roster_path)
         if artist:
             roster.add(artist)
 
-        user_input = input("请输入想要获取的数量 (输入 'all' 下载全部): ")
-        logger.info(f"用户设定下载数量: {user_input}")
-        if user_input.lower() == "all":
+        site_name = type(crawler).__name__
+        watermarks = WatermarkStore(os.path.join(data_output_path, "watermarks.json"))
+        if incremental and not crawler.supports_incremental(final_tags):
+            # 非 id 倒序的检索无法在已知id处停止，既不使用也不记录水位
+            logger.warning("增量抓取需要按 id 倒序检索，当前排序不支持，本次按普通模式抓取")
+            incremental = False
+        since_id = watermarks.get(site_name, final_tags) if incremental else None
+
+        if since_id is not None:
+            # 增量模式：抓到上次的最大id即停止，无需询问数量
+            logger.info(f"增量抓取: 只获取 id > {since_id} 的新数据")
             final_limit = total_count
         else:
-            final_limit = min(int(user_input), total_count)
+            user_input = await asyncio.to_thread(input, "请输入想要获取的数量 (输入 'all' 下载全部): ")
+            logger.info(f"用户设定下载数量: {user_input}")
+            if user_input.lower() == "all":
+                final_limit = total_count
+            else:
+                final_limit = min(int(user_input), total_count)
 
         if final_limit == 0:
             logger.info("已取消下载")
             return
 
+        # 每抓到一页就依次写入CSV、数据库并交给下载器，不在内存中堆积全部数据
+        sinks = []
+        if save_data:
+            sinks.append(CsvSink(data_manager))
+        if save_parquet:
+            dataset = ParquetDataset(config.PARQUET_PATH, getattr(config, "PARQUET_PARTITION_BY", ["Site"]))
+            query = os.path.splitext(os.path.basename(data_manager.file_path))[0]
+            sinks.append(ParquetSink(dataset, artist=artist, query=query))
+        if database:
+            sinks.append(DatabaseSink(db_manager))
+        if download_images:
+            sinks.append(DownloadSink(downloader, download_videos))
+
         logger.debug("启动爬虫获取数据")
-        image_items = crawler.start_crawling(final_tags, final_limit)
+        stats = await run_pipeline(crawler, final_tags, final_limit, sinks, since_id=since_id, transform=roster.assign_artists)
 
-        image_items = roster.assign_artists(image_items)
+        # 同步导出txt名单，供清洗工具等读取
+        if isinstance(roster, DBArtistRoster) and roster.changed:
+            roster.export_txt()
 
-        if save_data:
-            data_manager.save_as_csv(image_items)
-            data_manager.save_to_summary_csv(image_items)
-            if word_cloud:
-                data_manager.generate_wordcloud()
-                
-        if database:
-            db_manager = DBManager(database_path)
-            db_manager.save_items(image_items)
+        if incremental:
+            if stats.complete:
+                watermarks.update(site_name, final_tags, stats.max_id)
+            else:
+                logger.warning("本次抓取不完整，不更新增量水位")
 
-        if download_images:
-            downloader.download(image_items, download_videos)
+        if not stats.total:
+            logger.info("没有新数据")
+            return
 
-if __name__ == "__main__":
-    main()
+    if save_data and word_cloud:
+        # 按画师检索且启用数据库时直接读取统计表，否则流式统计CSV
+        frequencies = dict(db_manager.top_tags(limit=1000, artist=artist)) if db_manager and artist else None
+        data_manager.generate_wordcloud(frequencies or None)
 
+if __name__ == "__main__":
+    asyncio.run(main())
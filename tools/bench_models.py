@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import random
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.models import ImageItem
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ================= 配置区域 =================
+# 对比旧版普通 dataclass、slots 版 ImageItem、以及压缩标签后的内存占用
+# 参考结果（100万条，每条30个标签）：普通dataclass 703.5 MB，slots 563.3 MB，slots+压缩标签 441.2 MB
+ITEM_COUNT = 1_000_000
+TAG_POOL = 20000        # 标签种类数
+TAGS_PER_ITEM = 30      # 每条的标签数
+# ==========================================
+
+@dataclass
+class LegacyImageItem:
+    """旧版结构（无 slots，字符串逐个保存）"""
+    id: int
+    url: str
+    rating: str
+    tags: str
+    width: int
+    height: int
+    source: str = ""
+    created_at: str = ""
+    score: int = 0
+    site: str = ""
+    artist: str = ""
+
+def make_rows():
+    """生成模拟数据（字符串逐条新建，模拟JSON解析后的状态）"""
+    rng = random.Random(0)
+    pool = [f"tag_{i}" for i in range(TAG_POOL)]
+    ratings = ["general", "sensitive", "questionable", "explicit"]
+    for i in range(ITEM_COUNT):
+        tags = " ".join(rng.sample(pool, TAGS_PER_ITEM))
+        yield (i, f"https://cdn.example.com/{i}.jpg", "".join(rng.choice(ratings)),
+               "".join(tags), 1000, 1500, "", "2024-01-01", 0, "".join("Danbooru"), "Unknown")
+
+def measure(label, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = [build(row) for row in make_rows()]
+    cost = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    logger.info(f"{label:<12}: {current / 1024 / 1024:8.1f} MB，构建 {cost:.1f}s，{len(items)} 条")
+    del items
+
+def run_bench():
+    measure("普通dataclass", lambda r: LegacyImageItem(*r))
+    measure("slots", lambda r: ImageItem(*r))
+    measure("slots+压缩标签", lambda r: ImageItem(*r).compact_tags())
+
+if __name__ == "__main__":
+    from core.log_config import setup_global_logger
+    setup_global_logger()
+    run_bench()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crawlers.Danbooru import Danbooru
+from core.http import HttpClient
+from core.codec import JSON_BACKEND
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ================= 配置区域 =================
+# 对比 Danbooru 开启/关闭字段裁剪（only=）时每页的响应大小与解析耗时
+TAGS = ""
+PAGES = 5
+HEADERS = {"User-Agent": "BooruCrawler (by your_user_id)"}
+PROXY = None
+# ==========================================
+
+async def measure(crawler: Danbooru, client: HttpClient, projection: bool):
+    """抓取 PAGES 页，返回 (总字节数, 总解析耗时, 条目数)"""
+    crawler.field_projection = projection
+    total_bytes = 0
+    parse_time = 0.0
+    count = 0
+
+    for page in range(PAGES):
+        params = crawler._build_params(TAGS, page, crawler.MAX_LIMIT)
+        payload = await crawler._request_bytes(client, crawler.base_url, params)
+        total_bytes += len(payload)
+
+        start = time.perf_counter()
+        result = crawler._decode_page(payload)
+        parse_time += time.perf_counter() - start
+        count += len(result.items)
+
+    return total_bytes, parse_time, count
+
+async def run_bench():
+    crawler = Danbooru(headers=HEADERS, proxy=PROXY)
+    async with HttpClient(proxy=PROXY) as client:
+        full = await measure(crawler, client, projection=False)
+        only = await measure(crawler, client, projection=True)
+
+    logger.info(f"JSON解析库: {JSON_BACKEND}，每组 {PAGES} 页")
+    for label, (size, cost, count) in (("完整字段", full), ("字段裁剪", only)):
+        logger.info(f"{label}: {size / 1024:.1f} KB，解析 {cost * 1000:.1f} ms，{count} 条")
+    if full[0] and full[1]:
+        logger.info(f"响应体积减少 {1 - only[0] / full[0]:.1%}，解析耗时减少 {1 - only[1] / full[1]:.1%}")
+
+if __name__ == "__main__":
+    from core.log_config import setup_global_logger
+    setup_global_logger()
+    asyncio.run(run_bench())
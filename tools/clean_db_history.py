@@ -3,8 +3,10 @@ import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.database import DBManager, Artist
+from sqlalchemy import text
+from core.database import DBManager
 from core.roster import ArtistRoster
+from core.log_config import create_progress
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,8 +14,44 @@ logger = logging.getLogger(__name__)
 # ================= 配置区域 =================
 DB_PATH = r"D:\pyworks\python数据处理\databases\booru_gallery.db"
 ROSTER_PATH = r"D:\pyworks\BooruCrawler\output\datasets\artists_roster.txt"
+# 每批处理的未知画师图片数（每批提交一次并更新进度）
+CHUNK_SIZE = 5000
 # ==========================================
 
+# 本批次中未知画师图片的标签与名单的匹配结果 (image_id, 画师名)
+MATCH_SQL = """
+INSERT INTO temp.matches (image_id, name)
+SELECT DISTINCT it.image_id, rt.name
+FROM image_artists ia
+JOIN image_tags it ON it.image_id = ia.image_id
+JOIN temp.roster_tags rt ON rt.tag_id = it.tag_id
+WHERE ia.artist_id = :unknown AND ia.image_id BETWEEN :lo AND :hi
+"""
+
+# 新画师关联对应的 画师-标签 统计（只计入尚不存在的关联）
+STATS_ADD_SQL = """
+INSERT INTO artist_tag_stats (artist_id, tag_id, count)
+SELECT a.id, it.tag_id, COUNT(*)
+FROM temp.matches m
+JOIN artists a ON a.name = m.name
+JOIN image_tags it ON it.image_id = m.image_id
+WHERE NOT EXISTS (SELECT 1 FROM image_artists ia WHERE ia.image_id = m.image_id AND ia.artist_id = a.id)
+GROUP BY a.id, it.tag_id
+ON CONFLICT (artist_id, tag_id) DO UPDATE SET count = count + excluded.count
+"""
+
+# 移出 Unknown 的图片从 Unknown 的统计中扣除
+STATS_REMOVE_UNKNOWN_SQL = """
+UPDATE artist_tag_stats
+SET count = count - (
+    SELECT COUNT(*) FROM image_tags it
+    WHERE it.tag_id = artist_tag_stats.tag_id
+    AND it.image_id IN (SELECT DISTINCT image_id FROM temp.matches)
+)
+WHERE artist_id = :unknown
+AND tag_id IN (SELECT it.tag_id FROM image_tags it WHERE it.image_id IN (SELECT image_id FROM temp.matches))
+"""
+
 def clean_database():
     logger.info("开始清洗数据库未知画师数据")
     roster = ArtistRoster(ROSTER_PATH)
@@ -22,45 +60,64 @@ def clean_database():
         return
 
     db_manager = DBManager(DB_PATH)
-    session = db_manager.Session()
     updated_count = 0
 
-    try:
-        unknown_artist = session.query(Artist).filter_by(name='Unknown').first()
-        if not unknown_artist:
+    # 临时表只在当前连接可见，全程使用同一个连接
+    with db_manager.engine.connect() as conn:
+        unknown_id = conn.execute(text("SELECT id FROM artists WHERE name = 'Unknown'")).scalar()
+        if unknown_id is None:
             logger.info("数据库中没有未知画师")
             return
 
-        unknown_images = unknown_artist.images
+        image_ids = conn.execute(
+            text("SELECT image_id FROM image_artists WHERE artist_id = :unknown ORDER BY image_id"),
+            {"unknown": unknown_id}
+        ).scalars().all()
+        logger.info(f"发现 {len(image_ids)} 张未匹配画师的图片，开始匹配...")
+
+        # 名单载入临时表，并与标签表按小写名称关联（与逐条匹配时的规则一致）
+        conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS roster (name TEXT PRIMARY KEY)"))
+        conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS roster_tags (tag_id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE TEMP TABLE IF NOT EXISTS matches (image_id INTEGER, name TEXT)"))
+        conn.execute(text("INSERT OR IGNORE INTO temp.roster (name) VALUES (:name)"), [{"name": name} for name in roster.artists])
+        conn.execute(text("INSERT INTO temp.roster_tags SELECT t.id, r.name FROM tags t JOIN temp.roster r ON r.name = lower(t.name)"))
+        conn.commit()
 
-        logger.info(f"发现 {len(unknown_images)} 张未匹配画师的图片，开始匹配...")
+        try:
+            with create_progress() as progress:
+                task_id = progress.add_task("匹配画师中...", total=len(image_ids), style="bold green")
 
-        for img in unknown_images:
-            tag_names = [tag.name for tag in img.tags]
-            tags_str = " ".join(tag_names)
+                for start in range(0, len(image_ids), CHUNK_SIZE):
+                    chunk = image_ids[start:start + CHUNK_SIZE]
+                    params = {"unknown": unknown_id, "lo": chunk[0], "hi": chunk[-1]}
 
-            matched_artists = roster.extract_artists(tags_str)
+                    conn.execute(text(MATCH_SQL), params)
+                    # 补建缺失的画师，同步统计表，写入新关联，再移除这些图片的 Unknown 关联
+                    conn.execute(text("INSERT OR IGNORE INTO artists (name) SELECT DISTINCT name FROM temp.matches"))
+                    conn.execute(text(STATS_ADD_SQL))
+                    conn.execute(text(STATS_REMOVE_UNKNOWN_SQL), {"unknown": unknown_id})
+                    conn.execute(text("DELETE FROM artist_tag_stats WHERE artist_id = :unknown AND count <= 0"), {"unknown": unknown_id})
+                    conn.execute(text(
+                        "INSERT OR IGNORE INTO image_artists (image_id, artist_id) "
+                        "SELECT m.image_id, a.id FROM temp.matches m JOIN artists a ON a.name = m.name"
+                    ))
+                    conn.execute(text(
+                        "DELETE FROM image_artists WHERE artist_id = :unknown "
+                        "AND image_id IN (SELECT image_id FROM temp.matches)"
+                    ), {"unknown": unknown_id})
+                    updated_count += conn.execute(text("SELECT COUNT(DISTINCT image_id) FROM temp.matches")).scalar()
+                    conn.execute(text("DELETE FROM temp.matches"))
+                    conn.commit()
 
-            if matched_artists:
-                img.artists.remove(unknown_artist)
-                
-                for a_name in matched_artists:
-                    real_artist = db_manager._get_or_create(session, Artist, name=a_name)
-                    if real_artist not in img.artists:
-                        img.artists.append(real_artist)
-                
-                updated_count += 1
+                    progress.update(task_id, advance=len(chunk))
 
-        session.commit()
-        logger.info(f"成功匹配 {updated_count} 张图片的画师")
+            logger.info(f"成功匹配 {updated_count} 张图片的画师")
 
-    except Exception as e:
-        session.rollback()
-        logger.error(f"清洗过程出错: {e}")
-    finally:
-        session.close()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"清洗过程出错: {e}")
 
 if __name__ == "__main__":
     from core.log_config import setup_global_logger
     setup_global_logger()
-    clean_database()
\ No newline at end of file
+    clean_database()
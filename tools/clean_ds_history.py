@@ -4,6 +4,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.roster import ArtistRoster
+from core.dataset import ParquetDataset
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +14,9 @@ logger = logging.getLogger(__name__)
 # 配置画师名单 txt 和 汇总数据 csv 的路径
 ROSTER_PATH = r"D:\pyworks\BooruCrawler\output\datasets\artists_roster.txt"
 CSV_PATH = r"D:\pyworks\BooruCrawler\output\datasets\datas.csv"
+# 设置后改为清洗 Parquet 数据集，忽略 CSV_PATH
+PARQUET_PATH = None
+PARQUET_PARTITION_BY = ["Site"]
 # ==========================================
 
 def run_cleaner():
@@ -20,7 +24,10 @@ def run_cleaner():
     roster = ArtistRoster(filepath=ROSTER_PATH)
     logger.info(f"当前画师知识库已收录 {len(roster.artists)} 位画师。")
     
-    roster.clean_summary_dataset(CSV_PATH)
+    if PARQUET_PATH:
+        roster.clean_parquet_dataset(ParquetDataset(PARQUET_PATH, PARQUET_PARTITION_BY))
+    else:
+        roster.clean_summary_dataset(CSV_PATH)
 
 if __name__ == "__main__":
     from core.log_config import setup_global_logger
@@ -1,5 +1,9 @@
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 # from tqdm import tqdm
 from rich.progress import (
@@ -11,6 +15,7 @@ from rich.progress import (
     MofNCompleteColumn,
     TimeElapsedColumn
 )
+from contextlib import nullcontext
 import logging
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,13 +23,22 @@ sys.path.append(project_root)
 
 from core.log_config import setup_global_logger, console
 from core.database import DBManager
-from core.models import ImageItem
+from core.vocab import TAG_VOCAB
+from core.dataset import ParquetDataset
 
 logger = logging.getLogger(__name__)
 
 # ================= 配置区域 =================
 CSV_PATH = r"D:\pyworks\BooruCrawler\output\datasets\datas.csv"
+# 设置后改为从 Parquet 数据集导入（只读取需要的列），忽略 CSV_PATH
+PARQUET_PATH = None
+PARQUET_PARTITION_BY = ["Site"]
 DB_PATH = r"D:\pyworks\python数据处理\databases\booru_gallery.db"
+# 批量导入模式：导入期间关闭同步刷盘以提速，结束后自动恢复（中途断电需重新导入）
+BULK_LOAD = True
+# 每块行数与解析进程数（解析在子进程中并行，写库由主进程单线程完成）
+CHUNK_SIZE = 20000
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
 # ==========================================
 
 def get_total_lines(filepath):
@@ -34,20 +48,98 @@ def get_total_lines(filepath):
         total_lines = sum(1 for _ in f) - 1
     return total_lines
 
+def _to_int(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors='coerce').fillna(0).astype(np.int64)
+
+def parse_chunk(chunk: pd.DataFrame) -> dict:
+    """
+    子进程：整块向量化解析字段，并拆分画师与标签
+    标签在块内先编码为局部序号（pd.factorize），主进程只需把块内不重复的标签名映射到全局id
+    """
+    chunk = chunk.fillna('')
+    post_id = pd.to_numeric(chunk['Id'], errors='coerce')
+    chunk = chunk[post_id.notna()]
+    post_id = post_id[post_id.notna()].astype(np.int64)
+
+    size = chunk['Size'].str.split('x', n=1, expand=True).reindex(columns=[0, 1])
+    frame = pd.DataFrame({
+        "post_id": post_id,
+        "site": chunk['Site'].replace('', 'Unknown'),
+        "file_url": chunk['File_URL'],
+        "rating": chunk['Rating'],
+        "score": _to_int(chunk['Score']),
+        "width": _to_int(size[0]),
+        "height": _to_int(size[1]),
+        "posted_at": chunk['Posted'],
+    })
+
+    artists = [
+        {a.strip() for a in names.split(',') if a.strip()} if names else {"Unknown"}
+        for names in chunk['Artist']
+    ]
+
+    exploded = chunk['Tags'].str.split().explode().dropna()
+    codes, uniques = pd.factorize(exploded)
+    # 每行标签在 codes 中的起止位置
+    row_pos = np.searchsorted(chunk.index.to_numpy(), exploded.index.to_numpy())
+    bounds = np.searchsorted(row_pos, np.arange(len(chunk) + 1))
+
+    return {
+        "rows": frame.to_dict('records'),
+        "artists": artists,
+        "codes": codes.astype(np.int64),
+        "bounds": bounds,
+        "uniques": list(uniques),
+    }
+
+def encode_tags(prepared: dict) -> list[set]:
+    """主进程：块内局部序号 -> 全局标签id（每个不同的标签只查一次字典）"""
+    lookup = np.fromiter((TAG_VOCAB.get_id(name) for name in prepared["uniques"]), dtype=np.int64, count=len(prepared["uniques"]))
+    global_ids = lookup[prepared["codes"]].tolist()
+    bounds = prepared["bounds"]
+    return [set(global_ids[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)]
+
+def iter_prepared(pool: ProcessPoolExecutor, reader):
+    """按顺序取回解析结果，最多预读 WORKERS*2 块，避免整个CSV进入内存"""
+    pending = deque()
+    for chunk in reader:
+        pending.append((len(chunk), pool.submit(parse_chunk, chunk)))
+        if len(pending) >= WORKERS * 2:
+            size, future = pending.popleft()
+            yield size, future.result()
+    while pending:
+        size, future = pending.popleft()
+        yield size, future.result()
+
+def open_source():
+    """返回 (数据来源, 总行数, 按块读取的迭代器)"""
+    if PARQUET_PATH:
+        dataset = ParquetDataset(PARQUET_PATH, PARQUET_PARTITION_BY)
+        columns = ["Id", "Site", "Posted", "Artist", "Rating", "Score", "Size", "File_URL", "Tags"]
+        batches = dataset.iter_batches(columns=columns, batch_size=CHUNK_SIZE)
+        return PARQUET_PATH, dataset.count(), (batch.to_pandas() for batch in batches)
+
+    reader = pd.read_csv(CSV_PATH, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False)
+    return CSV_PATH, get_total_lines(CSV_PATH), reader
+
 def import_csv_to_db():
-    if not os.path.exists(CSV_PATH):
-        logger.error(f"CSV 文件不存在: {CSV_PATH}")
+    source_path = PARQUET_PATH or CSV_PATH
+    if not os.path.exists(source_path):
+        logger.error(f"数据文件不存在: {source_path}")
         return
 
-    total_rows = get_total_lines(CSV_PATH)
+    source_path, total_rows, reader = open_source()
     logger.info(f"准备导入 {total_rows} 条数据")
 
     db_manager = DBManager(DB_PATH)
-    chunk_size = 2500
+    # 导入期间不逐批维护统计表，导入完成后一次性重建
+    db_manager.maintain_stats = False
+    inserted = updated = 0
+    start = time.perf_counter()
     
-    logger.info("开始流式导入数据...")
+    logger.info(f"开始流式导入数据（{WORKERS} 个解析进程，每块 {CHUNK_SIZE} 行）...")
     
-    with Progress(
+    with db_manager.bulk_load() if BULK_LOAD else nullcontext(), ProcessPoolExecutor(max_workers=WORKERS) as pool, Progress(
         SpinnerColumn(),
         TextColumn("[bold green]{task.description}"),
         BarColumn(),
@@ -60,53 +152,24 @@ def import_csv_to_db():
         
         main_task = progress.add_task("数据迁移中...", total=total_rows)
     
-        for chunk in pd.read_csv(CSV_PATH, chunksize=chunk_size):
-            
-            chunk = chunk.fillna('')
-            batch_items = []
-            
-            for index, row in chunk.iterrows():
-                size_str = str(row.get('Size', ''))
-                width, height = 0, 0
-                if 'x' in size_str:
-                    try:
-                        w_str, h_str = size_str.split('x', 1)
-                        width = int(w_str)
-                        height = int(h_str)
-                    except ValueError:
-                        pass
-                
-                try:
-                    post_id = int(row.get('Id', 0))
-                except ValueError:
-                    continue
-                    
-                try:
-                    score = int(row.get('Score', 0))
-                except ValueError:
-                    score = 0
-
-                item = ImageItem(
-                    id=post_id,
-                    site=str(row.get('Site', 'Unknown')),
-                    created_at=str(row.get('Posted', '')),
-                    artist=str(row.get('Artist', 'Unknown')),
-                    rating=str(row.get('Rating', '')),
-                    score=score,
-                    width=width,
-                    height=height,
-                    url=str(row.get('File_URL', '')),
-                    tags=str(row.get('Tags', ''))
-                )
-                batch_items.append(item)
-            
-            db_manager.save_items(batch_items)
-            # pbar.update(len(chunk))
-            progress.update(main_task, advance=len(chunk))
-
-    logger.info(f"已将 {CSV_PATH} 中的历史数据已全部安全迁移至 SQLite 数据库 {DB_PATH} 中")
+        for size, prepared in iter_prepared(pool, reader):
+            if prepared["rows"]:
+                tags = encode_tags(prepared)
+                new, changed = db_manager.save_rows(prepared["rows"], prepared["artists"], tags)
+                inserted += new
+                updated += changed
+
+            done = progress.tasks[0].completed + size
+            elapsed = time.perf_counter() - start
+            progress.update(main_task, advance=size, description=f"数据迁移中 {done / elapsed:,.0f} 行/秒")
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"导入完成: 新增 {inserted} 条，更新 {updated} 条，用时 {elapsed:.1f}s（{total_rows / elapsed:,.0f} 行/秒）")
+    logger.info(f"已将 {source_path} 中的历史数据已全部安全迁移至 SQLite 数据库 {DB_PATH} 中")
+    logger.info("重建统计表...")
+    db_manager.rebuild_stats()
 
 if __name__ == "__main__":
     from core.log_config import setup_global_logger
     setup_global_logger()
-    import_csv_to_db()
\ No newline at end of file
+    import_csv_to_db()
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import DBManager
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ================= 配置区域 =================
+DB_PATH = r"D:\pyworks\python数据处理\databases\booru_gallery.db"
+# 统计共现的高频标签数
+PAIR_SCOPE = 1000
+# 重建后展示的标签数
+SHOW_TOP = 20
+# ==========================================
+
+def rebuild():
+    db_manager = DBManager(DB_PATH)
+    logger.info("开始重建统计表...")
+    start = time.perf_counter()
+    db_manager.rebuild_stats(pair_scope=PAIR_SCOPE)
+    logger.info(f"重建用时 {time.perf_counter() - start:.1f}s")
+
+    top = db_manager.top_tags(limit=SHOW_TOP)
+    logger.info("出现次数最多的标签: " + ", ".join(f"{name}({count})" for name, count in top))
+
+if __name__ == "__main__":
+    from core.log_config import setup_global_logger
+    setup_global_logger()
+    rebuild()
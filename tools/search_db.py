@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import DBManager
+from core.search import TagSearch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ================= 配置区域 =================
+DB_PATH = r"D:\pyworks\python数据处理\databases\booru_gallery.db"
+# 检索式（命令行参数优先）：标签取交集，-tag 排除，~a ~b 至少含其一
+# 元条件：rating:general / rating:g,s / score:>50 / score:10..20 / width:>=1920 / site:danbooru / artist:xxx / order:score
+QUERY = "1girl -comic rating:general score:>50"
+LIMIT = 20
+# 重建倒排索引（数据库中的数据被删除或改写后使用）
+REBUILD = False
+# ==========================================
+
+def run_search():
+    query = " ".join(sys.argv[1:]) or QUERY
+    db_manager = DBManager(DB_PATH)
+
+    start = time.perf_counter()
+    engine = TagSearch(db_manager, refresh=not REBUILD)
+    if REBUILD:
+        engine.rebuild()
+    logger.info(f"索引就绪，用时 {time.perf_counter() - start:.2f}s（{len(engine.ids)} 张图片）")
+
+    start = time.perf_counter()
+    total, rows = engine.search(query, limit=LIMIT)
+    logger.info(f"检索 '{query}': 命中 {total} 张，用时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for row in rows:
+        logger.info(f"[{row['site']}] {row['post_id']}  {row['rating']}  score={row['score']}  {row['width']}x{row['height']}  {row['file_url']}")
+
+if __name__ == "__main__":
+    from core.log_config import setup_global_logger
+    setup_global_logger()
+    run_search()